@@ -0,0 +1,317 @@
+"""
+Offline benchmark and overhead-regression suite for the dd_mlops_costs reporting path.
+
+Measures what report_job_cost adds to a job, phase by phase (import, region
+detection, glue.get_job, calculate_glue_cost, build_tags, payload serialization,
+the Datadog POST and the end-to-end call), plus throughput of batch costing and
+backfill. AWS calls go through botocore Stubber and Datadog is replaced by a local
+HTTP stand-in for /api/v1/series with configurable latency and failure rate, so
+nothing leaves the machine.
+
+Results are compared with a baseline file (benchmarks/baseline.json by default);
+the run exits 1 if any figure regresses beyond the tolerance. A baseline records
+the workload parameters it was measured with and is only compared against runs
+with the same parameters; a mismatch exits 2 without comparing. A missing
+baseline exits 3 before anything is measured, unless --allow-missing-baseline is
+given (for a first run that only prints figures).
+
+    python benchmarks/bench_reporting.py --update-baseline   # record a baseline
+    python benchmarks/bench_reporting.py                     # compare with it
+    python benchmarks/bench_reporting.py --latency 0.2 --failure-rate 0.5 \
+        --baseline benchmarks/baseline-slow.json --update-baseline
+
+Baselines are machine-specific, so none is committed; record one on the machine
+that runs the check.
+"""
+import os
+import sys
+import gzip
+import json
+import time
+import random
+import argparse
+import tempfile
+import threading
+import statistics
+import subprocess
+import tracemalloc
+import datetime as dt
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+DEFAULT_BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+DEFAULT_TOLERANCE = 0.5
+# Regressions smaller than these absolute amounts are treated as timer / allocator noise.
+MIN_DELTA_US = 100.0
+MIN_DELTA_KIB = 16.0
+DEFAULT_ITERATIONS = 200
+
+class DatadogStandIn:
+    """Local /api/v1/series endpoint with configurable latency and failure rate."""
+
+    def __init__(self, latency: float = 0.0, failure_rate: float = 0.0):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.series_received = 0
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Buffer the response so headers and body leave in one write; separate small
+            # writes stall on Nagle's algorithm and delayed ACKs and dominate the timing.
+            wbufsize = -1
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers["Content-Length"]))
+                if self.headers.get("Content-Encoding") == "gzip":
+                    body = gzip.decompress(body)
+                if stand_in.latency:
+                    time.sleep(stand_in.latency)
+                status = 500 if random.random() < stand_in.failure_rate else 202
+                if status == 202:
+                    stand_in.series_received += len(json.loads(body)["series"])
+                self.send_response(status)
+                self.send_header("Content-Length", "2")
+                self.end_headers()
+                self.wfile.write(b"{}")
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/api/v1/series"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+
+def measure(fn, iterations: int, setup=None) -> dict:
+    """Runs fn repeatedly; returns median/p95 latency (us) and peak traced allocation (KiB)."""
+    timings = []
+    for _ in range(iterations):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    if setup is not None:
+        setup()
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    timings.sort()
+    return {
+        "median_us": statistics.median(timings) * 1e6,
+        "p95_us": timings[int(0.95 * (len(timings) - 1))] * 1e6,
+        "peak_kib": peak / 1024,
+    }
+
+def measure_import(iterations: int) -> dict:
+    """Times `import dd_mlops_costs` in fresh interpreters."""
+    code = "import time; t = time.perf_counter(); import dd_mlops_costs; print(time.perf_counter() - t)"
+    env = dict(os.environ, PYTHONPATH=REPO_ROOT)
+    timings = sorted(
+        float(subprocess.check_output([sys.executable, "-c", code], env=env))
+        for _ in range(iterations)
+    )
+    return {"median_us": statistics.median(timings) * 1e6, "p95_us": timings[-1] * 1e6}
+
+def configure_environment(tmp_dir: str) -> None:
+    os.environ.update({
+        "AWS_REGION": "us-east-1",
+        "AWS_ACCESS_KEY_ID": "bench",
+        "AWS_SECRET_ACCESS_KEY": "bench",
+        "AWS_EC2_METADATA_DISABLED": "true",
+        "DATADOG_API_KEY": "bench",
+        "JOB_NAME": "bench-job",
+        "JOB_RUN_ID": "jr_bench",
+        "GLUE_WORKER_TYPE": "G.1X",
+        "GLUE_NUMBER_OF_WORKERS": "10",
+        "DD_MLOPS_CACHE_DIR": tmp_dir,
+        "DD_MLOPS_SPOOL_PATH": os.path.join(tmp_dir, "spool.jsonl"),
+        "DD_MLOPS_PRICING_CATALOG": os.path.join(tmp_dir, "missing.ddpc"),
+    })
+    os.environ.pop("DD_MLOPS_COLLECTOR_ADDR", None)
+    os.environ.pop("JOB_ENVIRONMENT", None)
+
+def run_phases(stand_in: DatadogStandIn, iterations: int) -> dict:
+    import boto3
+    from botocore.stub import Stubber
+    from dd_mlops_costs import datadog_client, utils, job_context, report_job_cost, start_timer
+    from dd_mlops_costs.glue_costs import calculate_glue_cost
+    from dd_mlops_costs.pricing import get_glue_price
+
+    datadog_client.DATADOG_SERIES_URL = stand_in.url
+    resource_data = {"job_name": "bench-job", "region": "us-east-1", "worker_type": "G.1X", "number_of_workers": 10}
+    tags = datadog_client.build_tags("bench", "glue", resource_data, True)
+    metrics = [{"metric": "glue.job.cost", "value": 1.23}, {"metric": "glue.job.duration", "value": 456.0}]
+    series = datadog_client.build_series(metrics, tags)
+
+    glue = boto3.client("glue", region_name="us-east-1")
+    stubber = Stubber(glue)
+    for _ in range(iterations + 1):
+        stubber.add_response("get_job", {"Job": {"Name": "bench-job", "WorkerType": "G.1X", "NumberOfWorkers": 10}})
+    stubber.activate()
+
+    results = {
+        "import": measure_import(max(3, iterations // 40)),
+        "get_region": measure(utils.get_region, iterations, setup=utils.get_region.cache_clear),
+        "get_job": measure(lambda: job_context.fetch_job_details("bench-job", "us-east-1", glue), iterations),
+        "get_glue_price": measure(lambda: get_glue_price("us-east-1", "G.1X"), iterations),
+        "calculate_glue_cost": measure(lambda: calculate_glue_cost(resource_data, 3600), iterations),
+        "build_tags": measure(lambda: datadog_client.build_tags("bench", "glue", resource_data, True), iterations),
+        "serialize_payload": measure(lambda: list(datadog_client.iter_payloads(series)), iterations),
+        "datadog_post": measure(lambda: datadog_client.post_series(series, "bench"), max(10, iterations // 4)),
+    }
+
+    def reset_job():
+        job_context.resolve_job_context.cache_clear()
+        utils.get_region.cache_clear()
+        start_timer()
+
+    results["report_job_cost"] = measure(lambda: report_job_cost("bench", "glue"), iterations, setup=reset_job)
+    datadog_client.close_submitters(timeout=datadog_client.DEFAULT_TIME_BUDGET)
+
+    def queue_report():
+        datadog_client.get_submitter("bench").submit(metrics, tags)
+
+    results["shutdown_flush"] = measure(
+        lambda: datadog_client.close_submitters(timeout=datadog_client.DEFAULT_TIME_BUDGET),
+        max(10, iterations // 4), setup=queue_report,
+    )
+    return results
+
+def run_throughput(stand_in: DatadogStandIn, rows: int, jobs: int, runs_per_job: int) -> dict:
+    import numpy as np
+    import pandas as pd
+    import boto3
+    from botocore.stub import Stubber
+    from dd_mlops_costs import datadog_client, backfill
+    from dd_mlops_costs.glue_costs import calculate_glue_costs
+
+    datadog_client.DATADOG_SERIES_URL = stand_in.url
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        "worker_type": rng.choice(["G.1X", "G.2X", "G.4X"], rows),
+        "region": rng.choice(["us-east-1", "us-west-1", "sa-east-1"], rows),
+        "number_of_workers": rng.integers(2, 100, rows),
+        "duration_seconds": rng.random(rows) * 3600,
+    })
+    start = time.perf_counter()
+    calculate_glue_costs(df)
+    batch_seconds = time.perf_counter() - start
+
+    glue = boto3.client("glue", region_name="us-east-1")
+    stubber = Stubber(glue)
+    stubber.add_response("get_jobs", {"Jobs": [
+        {"Name": f"job-{i}", "WorkerType": "G.1X", "NumberOfWorkers": 10} for i in range(jobs)
+    ]})
+    started = dt.datetime(2024, 1, 1, tzinfo=dt.timezone.utc)
+    for i in range(jobs):
+        stubber.add_response("get_job_runs", {"JobRuns": [
+            {
+                "Id": f"jr_{i}_{r}", "JobName": f"job-{i}", "JobRunState": "SUCCEEDED",
+                "StartedOn": started + dt.timedelta(minutes=runs_per_job - r),
+                "CompletedOn": started + dt.timedelta(minutes=runs_per_job - r, seconds=30),
+                "ExecutionTime": 30, "DPUSeconds": 300.0,
+            }
+            for r in range(runs_per_job)
+        ]})
+    stubber.activate()
+    checkpoint = os.path.join(tempfile.mkdtemp(), "checkpoint.json")
+    start = time.perf_counter()
+    try:
+        submitted = backfill.run_backfill("bench", ["us-east-1"], {"bench": None}, checkpoint,
+                                          max_workers=1, requests_per_second=1e6,
+                                          client_factory=lambda session, region: glue)
+    except RuntimeError as e:
+        # A failed submission aborts the backfill; report zero throughput so it is flagged.
+        print(f"backfill failed: {e}")
+        submitted = 0
+    backfill_seconds = time.perf_counter() - start
+    return {
+        "calculate_glue_costs": {"rows_per_s": rows / batch_seconds},
+        "backfill": {"runs_per_s": submitted / backfill_seconds},
+    }
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """
+    Returns human-readable regressions: latencies or allocations above, or throughputs
+    below, baseline by more than tolerance (and, for latency/allocation, by more than
+    MIN_DELTA_US / MIN_DELTA_KIB).
+    """
+    regressions = []
+    for phase, figures in results.items():
+        for name, value in figures.items():
+            reference = baseline.get(phase, {}).get(name)
+            if reference is None or reference <= 0:
+                continue
+            if name.endswith("_per_s"):
+                regressed = value < reference / (1 + tolerance)
+            else:
+                min_delta = MIN_DELTA_KIB if name.endswith("_kib") else MIN_DELTA_US
+                regressed = value > reference * (1 + tolerance) and value - reference > min_delta
+            if regressed:
+                regressions.append(f"{phase}.{name}: {value:.1f} vs baseline {reference:.1f}")
+    return regressions
+
+# Arguments that define the measured workload; a baseline is only valid for the same values.
+WORKLOAD_PARAMETERS = ("iterations", "rows", "jobs", "runs_per_job", "latency", "failure_rate")
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--iterations", type=int, default=DEFAULT_ITERATIONS)
+    parser.add_argument("--rows", type=int, default=1_000_000, help="Rows for the batch costing benchmark")
+    parser.add_argument("--jobs", type=int, default=50, help="Jobs for the backfill benchmark")
+    parser.add_argument("--runs-per-job", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds the Datadog stand-in waits per request")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Share of Datadog requests answered with 500")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE_PATH)
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="Allowed relative regression")
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--allow-missing-baseline", action="store_true",
+                        help="Exit 0 instead of 3 when the baseline file does not exist")
+    args = parser.parse_args(argv)
+
+    if not args.update_baseline and not args.allow_missing_baseline and not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; record one with --update-baseline "
+              "or pass --allow-missing-baseline")
+        return 3
+
+    tmp_dir = tempfile.mkdtemp()
+    configure_environment(tmp_dir)
+    stand_in = DatadogStandIn(args.latency, args.failure_rate)
+    try:
+        results = run_phases(stand_in, args.iterations)
+        results.update(run_throughput(stand_in, args.rows, args.jobs, args.runs_per_job))
+    finally:
+        stand_in.close()
+
+    for phase, figures in results.items():
+        print(f"{phase:22s} " + "  ".join(f"{name}={value:,.1f}" for name, value in figures.items()))
+
+    parameters = {name: getattr(args, name) for name in WORKLOAD_PARAMETERS}
+    if args.update_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump({"parameters": parameters, "results": results}, f, indent=2, sort_keys=True)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; nothing to compare with")
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline.get("parameters") != parameters:
+        print(f"Baseline {args.baseline} was recorded with {baseline.get('parameters')}, not {parameters}; "
+              "not comparing. Re-record it with --update-baseline or pass a matching --baseline.")
+        return 2
+    regressions = compare(results, baseline["results"], args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
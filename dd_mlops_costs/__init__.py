@@ -1,2 +1,4 @@
 from .cost_tracker import report_job_cost
 from .utils import start_timer, get_elapsed_time
+from .glue_costs import calculate_glue_costs
+from .spans import cost_span
@@ -0,0 +1,328 @@
+"""
+Incremental backfill of Glue job-run costs into Datadog.
+
+Every Glue job in the given regions (and accounts, one boto3 session each) is
+listed with get_jobs, and its finished runs are streamed with get_job_runs. Each
+run is priced from its DPUSeconds when Glue reports it, or from ExecutionTime and
+the run's own worker configuration otherwise, at the Flex DPU-hour rate for runs with
+ExecutionClass FLEX. Costs are submitted in bulk with the
+run's completion time as the timestamp, so jobs that never called report_job_cost
+are covered too.
+
+A JSON checkpoint file records, per job, the point up to which runs have been
+submitted; reruns only fetch newer runs. API calls are spread over a bounded thread
+pool and pass through a per-region rate limiter to stay within Glue throttling limits.
+
+Note: Datadog only accepts points older than one hour on /api/v1/series for metrics
+with historical metrics ingestion enabled.
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from .pricing import GLUE_WORKER_DPUS
+from .datadog_client import build_tags, build_series, post_series
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_RUN_STATES = {"SUCCEEDED", "FAILED", "STOPPED", "TIMEOUT", "ERROR"}
+
+DEFAULT_CHECKPOINT_PATH = "glue_backfill_checkpoint.json"
+DEFAULT_MAX_WORKERS = 8
+# Glue control-plane calls per second per region; Glue throttles well above this.
+DEFAULT_REQUESTS_PER_SECOND = 5.0
+# Number of priced runs buffered before a submission to Datadog.
+DEFAULT_SUBMIT_BATCH = 5000
+# glue_worker_type tag value for runs sized by MaxCapacity (legacy and Python shell jobs).
+MAXCAPACITY_WORKER_TYPE = "maxcapacity"
+
+class RateLimiter:
+    """Thread-safe token bucket allowing `rate` acquisitions per second."""
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.capacity = burst if burst is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+def make_glue_client(session, region: str):
+    """Creates a Glue client with adaptive retries, which back off on throttling errors."""
+    from botocore.config import Config
+    config = Config(retries={"mode": "adaptive", "max_attempts": 10}, max_pool_connections=DEFAULT_MAX_WORKERS)
+    return session.client("glue", region_name=region, config=config)
+
+def iter_jobs(glue, limiter: Optional[RateLimiter] = None) -> Iterator[Dict]:
+    """Yields every Glue job definition, following get_jobs pagination."""
+    kwargs = {}
+    while True:
+        if limiter is not None:
+            limiter.acquire()
+        response = glue.get_jobs(**kwargs)
+        yield from response.get("Jobs", [])
+        token = response.get("NextToken")
+        if not token:
+            return
+        kwargs["NextToken"] = token
+
+def iter_job_runs(glue, job_name: str, watermark: float = 0.0,
+                  limiter: Optional[RateLimiter] = None) -> Iterator[Dict]:
+    """
+    Yields runs of job_name started after watermark (epoch seconds), newest first.
+
+    get_job_runs returns runs in reverse start order, so pagination stops at the
+    first page that reaches the watermark.
+    """
+    kwargs = {"JobName": job_name}
+    while True:
+        if limiter is not None:
+            limiter.acquire()
+        response = glue.get_job_runs(**kwargs)
+        for run in response.get("JobRuns", []):
+            if run["StartedOn"].timestamp() <= watermark:
+                return
+            yield run
+        token = response.get("NextToken")
+        if not token:
+            return
+        kwargs["NextToken"] = token
+
+def run_to_record(run: Dict, job: Dict, region: str) -> Dict:
+    """
+    Flattens a Glue job run into a row for calculate_glue_costs.
+
+    Runs without WorkerType (legacy MaxCapacity and Python shell jobs) get the worker
+    type "maxcapacity" and, unless Glue reports DPUSeconds, are priced from
+    MaxCapacity DPUs for the run's ExecutionTime. The run's ExecutionClass (STANDARD
+    when Glue omits it) selects the DPU-hour rate.
+    """
+    worker_type = run.get("WorkerType") or job.get("WorkerType")
+    number_of_workers = run.get("NumberOfWorkers") or job.get("NumberOfWorkers")
+    duration_seconds = float(run.get("ExecutionTime", 0))
+    dpu_seconds = run.get("DPUSeconds")
+    if not worker_type:
+        worker_type = MAXCAPACITY_WORKER_TYPE
+        number_of_workers = run.get("MaxCapacity") or job.get("MaxCapacity") or 1
+        if dpu_seconds is None:
+            dpu_seconds = float(number_of_workers) * duration_seconds
+    return {
+        "job_name": run["JobName"],
+        "run_id": run["Id"],
+        "region": region,
+        "worker_type": worker_type,
+        "number_of_workers": number_of_workers,
+        "duration_seconds": duration_seconds,
+        "dpu_seconds": dpu_seconds,
+        "execution_class": run.get("ExecutionClass") or job.get("ExecutionClass") or "STANDARD",
+        "status": run.get("JobRunState") == "SUCCEEDED",
+        "timestamp": int((run.get("CompletedOn") or run["StartedOn"]).timestamp()),
+    }
+
+def default_customer(job: Dict) -> str:
+    """Reads the customer from the job's --customer default argument."""
+    return job.get("DefaultArguments", {}).get("--customer", "unknown")
+
+def collect_job_runs(glue, job: Dict, region: str, checkpoint: Dict,
+                     limiter: Optional[RateLimiter] = None) -> Tuple[List[Dict], Dict]:
+    """
+    Fetches the finished runs of one job that are not yet covered by its checkpoint.
+
+    Returns the run records and the job's new checkpoint entry. The watermark only
+    advances past runs that are finished and not preceded by a still-running one;
+    finished runs newer than the watermark are remembered by id so they are not
+    submitted twice.
+    """
+    watermark = checkpoint.get("watermark", 0.0)
+    seen = set(checkpoint.get("run_ids", []))
+    records = []
+    finished = []
+    oldest_unfinished = None
+    for run in iter_job_runs(glue, job["Name"], watermark, limiter):
+        started = run["StartedOn"].timestamp()
+        if run.get("JobRunState") not in TERMINAL_RUN_STATES:
+            oldest_unfinished = started if oldest_unfinished is None else min(oldest_unfinished, started)
+            continue
+        finished.append((started, run["Id"]))
+        if run["Id"] not in seen:
+            records.append(run_to_record(run, job, region))
+
+    if oldest_unfinished is None:
+        new_watermark = max([watermark] + [started for started, _ in finished])
+    else:
+        new_watermark = max([watermark] + [started for started, _ in finished if started < oldest_unfinished])
+    run_ids = sorted(run_id for started, run_id in finished if started > new_watermark)
+    return records, {"watermark": new_watermark, "run_ids": run_ids}
+
+def load_checkpoint(path: str) -> Dict:
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as f:
+        return json.load(f)
+
+def save_checkpoint(path: str, checkpoint: Dict) -> None:
+    """Writes the checkpoint atomically so an interrupted backfill never corrupts it."""
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    with open(tmp_path, "w") as f:
+        json.dump(checkpoint, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+def split_priceable(records: List[Dict]) -> Tuple[List[Dict], List[Dict]]:
+    """
+    Separates records that can be priced from those that cannot: runs without
+    DPUSeconds whose worker type is not in GLUE_WORKER_DPUS.
+    """
+    priceable, unpriceable = [], []
+    for record in records:
+        if record["dpu_seconds"] is not None or record["worker_type"] in GLUE_WORKER_DPUS:
+            priceable.append(record)
+        else:
+            unpriceable.append(record)
+    return priceable, unpriceable
+
+def records_to_series(records: List[Dict]) -> List[Dict]:
+    """
+    Prices run records in one vectorized pass and turns them into Datadog series.
+
+    Every record must be priceable (see split_priceable).
+    """
+    import pandas as pd
+    from .glue_costs import calculate_glue_costs
+
+    df = pd.DataFrame.from_records(records)
+    df = df.assign(cost=calculate_glue_costs(df))
+
+    series = []
+    for row in df.itertuples(index=False):
+        tags = build_tags(row.customer, "glue",
+                          {"region": row.region, "worker_type": row.worker_type,
+                           "execution_class": row.execution_class}, row.status)
+        metrics = [
+            {"metric": "glue.job.cost", "value": row.cost},
+            {"metric": "glue.job.duration", "value": row.duration_seconds}
+        ]
+        series.extend(build_series(metrics, tags, row.timestamp))
+    return series
+
+def run_backfill(
+    dd_api_key: str,
+    regions: List[str],
+    sessions: Optional[Dict[str, object]] = None,
+    checkpoint_path: str = DEFAULT_CHECKPOINT_PATH,
+    max_workers: int = DEFAULT_MAX_WORKERS,
+    requests_per_second: float = DEFAULT_REQUESTS_PER_SECOND,
+    customer_resolver: Callable[[Dict], str] = default_customer,
+    client_factory: Callable = make_glue_client,
+    submit_batch: int = DEFAULT_SUBMIT_BATCH,
+    dry_run: bool = False
+) -> int:
+    """
+    Backfills Glue job-run costs for every job in the given accounts and regions.
+
+    Parameters:
+      - sessions: {account label: boto3.Session}; defaults to the ambient session.
+      - client_factory: (session, region) -> Glue client; swap in a stubbed client for tests.
+      - dry_run: price runs but neither submit them nor advance the checkpoint.
+
+    Runs that cannot be priced (unsupported worker type and no DPUSeconds) are
+    logged with their ids and not submitted; the checkpoint still moves past them,
+    so they must be backfilled separately once their worker type is supported.
+
+    Returns the number of runs submitted (or priced, for a dry run).
+    """
+    if sessions is None:
+        import boto3
+        sessions = {"default": boto3.Session()}
+
+    checkpoint = load_checkpoint(checkpoint_path)
+    pending_checkpoint = {}
+    customers = {}
+    buffer = []
+    submitted = 0
+
+    def flush() -> None:
+        nonlocal buffer, submitted
+        priceable, unpriceable = split_priceable(buffer)
+        if unpriceable:
+            logger.warning("Skipping %d runs with unsupported worker types %s: %s",
+                           len(unpriceable), sorted({record["worker_type"] for record in unpriceable}),
+                           ", ".join(f"{record['job_name']}/{record['run_id']}" for record in unpriceable))
+        series = records_to_series(priceable) if priceable else []
+        if dry_run:
+            logger.info("Dry run: priced %d runs", len(priceable))
+        elif series and not post_series(series, dd_api_key):
+            raise RuntimeError("Datadog submission failed; checkpoint not advanced")
+        if not dry_run:
+            checkpoint.update(pending_checkpoint)
+            save_checkpoint(checkpoint_path, checkpoint)
+        submitted += len(priceable)
+        buffer = []
+        pending_checkpoint.clear()
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {}
+        for account, session in sessions.items():
+            for region in regions:
+                glue = client_factory(session, region)
+                limiter = RateLimiter(requests_per_second)
+                for job in list(iter_jobs(glue, limiter)):
+                    key = f"{account}/{region}/{job['Name']}"
+                    customers[key] = customer_resolver(job)
+                    future = pool.submit(collect_job_runs, glue, job, region, checkpoint.get(key, {}), limiter)
+                    futures[future] = key
+
+        for future in as_completed(futures):
+            key = futures[future]
+            try:
+                records, entry = future.result()
+            except Exception as e:
+                logger.error("Failed to backfill %s: %s", key, e)
+                continue
+            for record in records:
+                record["customer"] = customers[key]
+            buffer.extend(records)
+            pending_checkpoint[key] = entry
+            if len(buffer) >= submit_batch:
+                flush()
+    flush()
+    logger.info("Backfilled %d Glue job runs", submitted)
+    return submitted
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Backfill Glue job-run costs into Datadog.")
+    parser.add_argument("--region", action="append", required=True, help="Region to backfill (repeatable)")
+    parser.add_argument("--profile", action="append", default=[], help="AWS profile / account to backfill (repeatable)")
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT_PATH, help="Checkpoint file path")
+    parser.add_argument("--max-workers", type=int, default=DEFAULT_MAX_WORKERS)
+    parser.add_argument("--rps", type=float, default=DEFAULT_REQUESTS_PER_SECOND, help="Glue API calls per second per region")
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args(argv)
+
+    dd_api_key = os.environ.get("DATADOG_API_KEY")
+    if not dd_api_key and not args.dry_run:
+        parser.error("DATADOG_API_KEY must be set")
+
+    import boto3
+    sessions = {profile: boto3.Session(profile_name=profile) for profile in args.profile} or None
+    logging.basicConfig(level=logging.INFO)
+    run_backfill(dd_api_key, args.region, sessions, args.checkpoint, args.max_workers, args.rps, dry_run=args.dry_run)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,235 @@
+"""
+Local pre-aggregating collector for high-volume short jobs.
+
+Jobs send one small UDP datagram per report (see datadog_client.CollectorClient)
+instead of one Datadog request each. The collector rolls events up per tag set in
+fixed windows and flushes a single batch per window with, for every metric:
+count, sum, avg, max and p50/p95/p99 from a log-bucket sketch.
+
+The percentiles are plain gauges computed per window and per collector. Datadog
+cannot merge them: a p95 averaged or maxed over a longer time range or across
+hosts is not the p95 of the underlying events. Only count, sum and max roll up
+exactly (avg as sum / count); use the percentiles as per-window, per-host views.
+
+Run it next to the jobs with:
+    DATADOG_API_KEY=... python -m dd_mlops_costs.collector --port 8135 --window 60
+"""
+import os
+import sys
+import json
+import math
+import time
+import socket
+import logging
+from typing import Dict, List, Optional, Tuple
+from .datadog_client import MetricSubmitter, DEFAULT_COLLECTOR_PORT
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WINDOW_SECONDS = 60
+DEFAULT_MAX_TAG_SETS = 1000
+DEFAULT_RELATIVE_ACCURACY = 0.01
+QUANTILES = (0.5, 0.95, 0.99)
+OVERFLOW_TAGS = ("collector_overflow:true",)
+MAX_DATAGRAM_BYTES = 65535
+RECEIVE_BUFFER_BYTES = 4 * 1024 * 1024
+
+class LogSketch:
+    """
+    Mergeable quantile sketch with bounded relative error (DDSketch-style).
+
+    Positive values are counted in logarithmic buckets of ratio gamma, so any
+    quantile is returned within relative_accuracy of the true value. Values <= 0
+    are counted separately. Two sketches with the same accuracy merge by adding
+    bucket counts.
+    """
+
+    def __init__(self, relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.bins: Dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+        self.sum = 0.0
+        self.max = -math.inf
+
+    def add(self, value: float) -> None:
+        if not math.isfinite(value):
+            raise ValueError(f"Cannot add non-finite value {value} to a sketch")
+        if value <= 0:
+            self.zero_count += 1
+        else:
+            index = math.ceil(math.log(value) / self._log_gamma)
+            self.bins[index] = self.bins.get(index, 0) + 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other: "LogSketch") -> None:
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Cannot merge sketches with different relative accuracy")
+        for index, count in other.bins.items():
+            self.bins[index] = self.bins.get(index, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.sum += other.sum
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if seen > rank:
+                return min(2 * self.gamma ** index / (self.gamma + 1), self.max)
+        return self.max
+
+class Aggregator:
+    """Holds one window of sketches keyed by (tag set, metric), with a cap on tag sets."""
+
+    def __init__(self, max_tag_sets: int = DEFAULT_MAX_TAG_SETS,
+                 relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY):
+        self.max_tag_sets = max_tag_sets
+        self.relative_accuracy = relative_accuracy
+        self.sketches: Dict[Tuple[str, ...], Dict[str, LogSketch]] = {}
+        self.events = 0
+
+    def add(self, tags: List[str], values: Dict[str, float]) -> None:
+        """Adds one event; raises ValueError, leaving the window untouched, if any value is not finite."""
+        values = {metric: float(value) for metric, value in values.items()}
+        if not all(math.isfinite(value) for value in values.values()):
+            raise ValueError("Event values must be finite")
+        key = tuple(sorted(tags))
+        metrics = self.sketches.get(key)
+        if metrics is None:
+            if len(self.sketches) >= self.max_tag_sets:
+                key = OVERFLOW_TAGS
+                metrics = self.sketches.setdefault(key, {})
+            else:
+                metrics = self.sketches[key] = {}
+        for metric, value in values.items():
+            sketch = metrics.get(metric)
+            if sketch is None:
+                sketch = metrics[metric] = LogSketch(self.relative_accuracy)
+            sketch.add(value)
+        self.events += 1
+
+    def rollup(self) -> List[Tuple[List[str], List[Dict]]]:
+        """
+        Returns (tags, metrics) pairs summarizing the window.
+
+        The sketches are merged within the window only; the pNN values sent are
+        gauges and cannot be combined into percentiles over other windows or hosts.
+        """
+        rollups = []
+        for tags, metrics in self.sketches.items():
+            rolled = []
+            for metric, sketch in metrics.items():
+                rolled.append({"metric": f"{metric}.count", "value": sketch.count})
+                rolled.append({"metric": f"{metric}.sum", "value": sketch.sum})
+                rolled.append({"metric": f"{metric}.avg", "value": sketch.sum / sketch.count})
+                rolled.append({"metric": f"{metric}.max", "value": sketch.max})
+                for q in QUANTILES:
+                    rolled.append({"metric": f"{metric}.p{int(q * 100)}", "value": sketch.quantile(q)})
+            rollups.append((list(tags), rolled))
+        return rollups
+
+def parse_event(datagram: bytes) -> Tuple[List[str], Dict[str, float]]:
+    """
+    Decodes and validates a {"tags": [...], "values": {metric: value}} datagram.
+
+    Raises ValueError unless tags is a list of strings and values maps metric names
+    to finite numbers, so one bad event can never poison a window's aggregates.
+    """
+    event = json.loads(datagram)
+    if not isinstance(event, dict):
+        raise ValueError("event must be a JSON object")
+    tags = event.get("tags", [])
+    values = event.get("values")
+    if not isinstance(tags, list) or not all(isinstance(tag, str) for tag in tags):
+        raise ValueError("tags must be a list of strings")
+    if not isinstance(values, dict) or not values:
+        raise ValueError("values must be a non-empty object")
+    parsed = {}
+    for metric, value in values.items():
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+            raise ValueError(f"value of {metric!r} must be a finite number")
+        parsed[metric] = float(value)
+    return tags, parsed
+
+def serve(dd_api_key: str, host: str = "127.0.0.1", port: int = DEFAULT_COLLECTOR_PORT,
+          window: float = DEFAULT_WINDOW_SECONDS, max_tag_sets: int = DEFAULT_MAX_TAG_SETS,
+          stop_after: Optional[float] = None) -> None:
+    """
+    Receives events and flushes one aggregated batch per window until interrupted.
+
+    Windows are aligned to multiples of `window` seconds and each batch is stamped
+    with its window start. Submission happens on a MetricSubmitter thread, so a
+    slow Datadog endpoint never stalls the receive loop.
+    """
+    submitter = MetricSubmitter(dd_api_key)
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    # A large receive buffer absorbs bursts of job events while a window is flushed.
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RECEIVE_BUFFER_BYTES)
+    sock.bind((host, port))
+    logger.info("Cost collector listening on %s:%d (window %.0fs)", host, port, window)
+
+    deadline = None if stop_after is None else time.time() + stop_after
+    window_start = math.floor(time.time() / window) * window
+    aggregator = Aggregator(max_tag_sets)
+    try:
+        while True:
+            now = time.time()
+            if now >= window_start + window or (deadline is not None and now >= deadline):
+                for tags, metrics in aggregator.rollup():
+                    submitter.submit(metrics, tags, int(window_start))
+                logger.info("Flushed %d events across %d tag sets", aggregator.events, len(aggregator.sketches))
+                if deadline is not None and now >= deadline:
+                    break
+                window_start = math.floor(now / window) * window
+                aggregator = Aggregator(max_tag_sets)
+            wake_at = window_start + window if deadline is None else min(window_start + window, deadline)
+            sock.settimeout(max(0.01, wake_at - now))
+            try:
+                datagram = sock.recv(MAX_DATAGRAM_BYTES)
+            except socket.timeout:
+                continue
+            try:
+                aggregator.add(*parse_event(datagram))
+            except ValueError as e:
+                logger.warning("Dropping malformed collector event: %s", e)
+            except Exception:
+                # Never let one event take the collector (and its open window) down.
+                logger.exception("Dropping collector event that failed to aggregate")
+    except KeyboardInterrupt:
+        for tags, metrics in aggregator.rollup():
+            submitter.submit(metrics, tags, int(window_start))
+    finally:
+        sock.close()
+        submitter.close()
+
+def main(argv=None) -> int:
+    import argparse
+    parser = argparse.ArgumentParser(description="Aggregate dd_mlops_costs job events and forward them to Datadog.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_COLLECTOR_PORT)
+    parser.add_argument("--window", type=float, default=DEFAULT_WINDOW_SECONDS, help="Aggregation window in seconds")
+    parser.add_argument("--max-tag-sets", type=int, default=DEFAULT_MAX_TAG_SETS,
+                        help="Tag sets per window before events are folded into an overflow series")
+    args = parser.parse_args(argv)
+
+    dd_api_key = os.environ.get("DATADOG_API_KEY")
+    if not dd_api_key:
+        parser.error("DATADOG_API_KEY must be set")
+    logging.basicConfig(level=logging.INFO)
+    serve(dd_api_key, args.host, args.port, args.window, args.max_tag_sets)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,13 @@
 import os
+import time
 import logging
 from typing import Optional
-from .utils import get_elapsed_time
+from .utils import detect_environment, get_elapsed_time
 from .glue_costs import gather_glue_job_data, calculate_glue_cost
-from .datadog_client import build_tags, send_datadog_metrics
+from .emr_costs import gather_emr_job_data, calculate_emr_cost
+from .spans import get_span_costs
+from .sampler import stop_sampler
+from .datadog_client import build_tags, get_submitter, get_collector_client
 
 logger = logging.getLogger(__name__)
 
@@ -14,46 +18,98 @@ def report_job_cost(
     dd_api_key: Optional[str] = None,
     dd_app_key: Optional[str] = None,
     status: bool = True
-) -> float:
+) -> Optional[float]:
     """
     Computes the job cost for AWS Glue or EMR and submits custom metrics to Datadog.
+
+    Metrics are queued on a background submitter and delivered asynchronously, so this
+    call does not wait on the Datadog HTTP round trip. Pending metrics are flushed at
+    interpreter exit within the submitter's time budget. When DD_MLOPS_COLLECTOR_ADDR is
+    set, metrics go to the local collector instead, which aggregates many runs per request.
+
+    Stages timed with cost_span are priced with the same job data and sent in the same
+    batch as glue.job.span.cost / glue.job.span.duration, tagged with span:<path>.
+
+    If the timer was started with sample_workers=True, the cost is based on the sampled
+    average worker count instead of the configured NumberOfWorkers, and the average,
+    peak and idle share of workers are reported as glue.job.workers.* metrics.
+
+    On EMR the cost covers every cluster instance alive during the last duration_seconds,
+    each billed for its actual overlap with that window, and is reported as emr.job.*.
+    If the cluster's instances cannot be listed or an instance type has no price, no
+    emr.job.cost is sent; the other metrics are tagged cost_status:unpriced and None is
+    returned, so a missing price never shows up as a $0 job.
     
     Parameters:
       - customer: The customer identifier
+      - environment: "glue" or "emr" (auto-detected if not provided).
       - duration_seconds: Job runtime in seconds (if not provided, uses get_elapsed_time()).
       - dd_api_key: Datadog API key (or read from DATADOG_API_KEY environment variable).
+        Not needed when reporting through a local collector.
       - dd_app_key: (Optional) Datadog App key.
       - status: Job status (True for success, False for failure).
     
     Returns:
-      - The calculated cost.
+      - The calculated cost, or None if an EMR cost could not be priced.
       
     Maintenance Considerations:
-      - Regularly update the static pricing mappings and jmespath queries if the AWS Pricing API changes.
-      - Monitor dependency updates for boto3, datadog, and jmespath.
+      - Regularly update the static pricing mappings or rebuild the pricing catalog when AWS prices change.
+      - Monitor dependency updates for boto3 and requests.
       - Expand test coverage with mocks for external API calls.
       - Consider external configuration files for region mappings and pricing data in future versions.
     """
+    collector = get_collector_client()
     if dd_api_key is None:
         dd_api_key = os.environ.get("DATADOG_API_KEY")
-    if not dd_api_key:
+    if not dd_api_key and collector is None:
         raise ValueError("Datadog API key must be provided via argument or DATADOG_API_KEY environment variable.")
 
     if duration_seconds is None:
         duration_seconds = get_elapsed_time()
     
+    env = environment or detect_environment()
     resource_data = {}
-    cost = 0.0
+    utilization = stop_sampler()
 
-    resource_data = gather_glue_job_data()
-    cost = calculate_glue_cost(resource_data, duration_seconds)
+    if env == "glue":
+        resource_data = gather_glue_job_data()
+        if utilization is not None:
+            resource_data["configured_workers"] = resource_data["number_of_workers"]
+            resource_data["number_of_workers"] = utilization["avg_workers"]
+        cost = calculate_glue_cost(resource_data, duration_seconds)
+    elif env == "emr":
+        window_end = time.time()
+        resource_data = gather_emr_job_data(window_end - duration_seconds, window_end)
+        try:
+            cost = calculate_emr_cost(resource_data, duration_seconds)
+        except ValueError as e:
+            logger.error("Not reporting an EMR cost: %s", e)
+            cost = None
+    else:
+        raise ValueError(f"Unsupported environment: {env}")
     
-    tags = build_tags(customer, resource_data, status)
-    metrics = [
-        {"metric": "glue.job.cost", "value": cost},
-        {"metric": "glue.job.duration", "value": duration_seconds}
-    ]
+    tags = build_tags(customer, env, resource_data, status)
+    metrics = [{"metric": f"{env}.job.duration", "value": duration_seconds}]
+    if cost is None:
+        tags.append("cost_status:unpriced")
+    else:
+        metrics.insert(0, {"metric": f"{env}.job.cost", "value": cost})
+    if env == "emr" and "peak_instances" in resource_data:
+        metrics.append({"metric": "emr.job.instances.avg", "value": resource_data["avg_instances"]})
+        metrics.append({"metric": "emr.job.instances.peak", "value": resource_data["peak_instances"]})
+    if utilization is not None and env == "glue":
+        metrics.append({"metric": "glue.job.workers.avg", "value": utilization["avg_workers"]})
+        metrics.append({"metric": "glue.job.workers.peak", "value": utilization["peak_workers"]})
+        if utilization["idle_fraction"] is not None:
+            metrics.append({"metric": "glue.job.workers.idle_fraction", "value": utilization["idle_fraction"]})
     
-    send_datadog_metrics(metrics, tags, dd_api_key, dd_app_key)
-    logger.info("Job cost: $%.4f reported to Datadog with tags: %s", cost, tags)
+    for span in get_span_costs(resource_data) if env == "glue" else []:
+        span_tags = [f"span:{span['span']}"]
+        metrics.append({"metric": "glue.job.span.cost", "value": span["cost"], "tags": span_tags})
+        metrics.append({"metric": "glue.job.span.duration", "value": span["duration_seconds"], "tags": span_tags})
+
+    submitter = collector or get_submitter(dd_api_key, dd_app_key)
+    submitter.submit(metrics, tags, run_id=resource_data.get("job_run_id"))
+    if cost is not None:
+        logger.info("Job cost: $%.4f queued for Datadog with tags: %s", cost, tags)
     return cost
@@ -1,9 +1,48 @@
+import os
+import gzip
+import json
 import time
+import socket
+import atexit
 import logging
-import requests
+import threading
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional
+from .spool import write_spool
+
+if TYPE_CHECKING:
+    import requests
 
 logger = logging.getLogger(__name__)
 
+DATADOG_SERIES_URL = "https://api.datadoghq.com/api/v1/series"
+
+# --- Datadog /api/v1/series limits ---
+# Compressed request bodies must stay under 3.2 MB and must decompress to less than 62 MiB.
+MAX_PAYLOAD_BYTES = 3_200_000
+MAX_DECOMPRESSED_BYTES = 62_914_560
+
+# --- Submission timing ---
+# (connect, read) timeout applied to every POST so a slow endpoint cannot hold the job open.
+REQUEST_TIMEOUT = (2.0, 5.0)
+# Upper bound on how long job shutdown waits for queued metrics to be delivered.
+DEFAULT_TIME_BUDGET = 5.0
+# How long the background thread waits to coalesce more metrics into one request.
+DEFAULT_FLUSH_INTERVAL = 0.5
+
+# --- Local collector (see collector.py) ---
+COLLECTOR_ENV_VAR = "DD_MLOPS_COLLECTOR_ADDR"
+DEFAULT_COLLECTOR_PORT = 8135
+
+# --- Submission outcomes (see post_series_status) ---
+DELIVERED = "delivered"
+RETRY = "retry"
+REJECTED = "rejected"
+# 4xx answers that say nothing about the payload: timeouts, rate limits and a bad API key.
+RETRYABLE_CLIENT_ERRORS = {401, 403, 408, 429}
+
+_SESSION = None
+_SESSION_LOCK = threading.Lock()
+
 def build_tags(customer: str, environment: str, resource_data: dict, status: bool) -> list:
     """
     Builds low-cardinality tags for Datadog.
@@ -17,41 +56,344 @@ def build_tags(customer: str, environment: str, resource_data: dict, status: boo
     ]
     region = resource_data.get("region", "unknown")
     tags.append(f"region:{region}")
-    
-    tags.append(f"glue_worker_type:{resource_data.get('worker_type', 'unknown')}")
+
+    if environment == "emr":
+        instance_types = resource_data.get("instance_types", [])
+        if instance_types:
+            tags.append("emr_instance_types:" + ",".join(instance_types))
+        if resource_data.get("release_label"):
+            tags.append(f"emr_release_label:{resource_data['release_label']}")
+    else:
+        tags.append(f"glue_worker_type:{resource_data.get('worker_type', 'unknown')}")
+        if resource_data.get("execution_class"):
+            tags.append(f"glue_execution_class:{resource_data['execution_class'].lower()}")
 
     return tags
 
-def send_datadog_metrics(metrics: list, tags: list, dd_api_key: str, dd_app_key: str = None) -> None:
+def get_session() -> "requests.Session":
+    """
+    Returns the process-wide requests session used for Datadog submissions.
+
+    The session keeps connections alive between requests, so repeated flushes
+    reuse the same TLS connection instead of paying the handshake every time.
+    requests is imported here, on first use, usually from the submitter thread.
+    """
+    global _SESSION
+    if _SESSION is None:
+        with _SESSION_LOCK:
+            if _SESSION is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=4)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _SESSION = session
+    return _SESSION
+
+def build_series(metrics: list, tags: list, timestamp: Optional[int] = None) -> List[Dict]:
+    """
+    Converts metric dicts ({"metric": name, "value": value}) into Datadog series entries.
+
+    All metrics share the same tags and timestamp (defaults to now). A metric may
+    carry its own "tags" list, which is appended to the shared tags.
+    """
+    if timestamp is None:
+        timestamp = int(time.time())
+    return [
+        {
+            "metric": metric["metric"],
+            "points": [[timestamp, metric["value"]]],
+            "tags": tags + metric["tags"] if "tags" in metric else tags,
+            "type": "gauge"
+        }
+        for metric in metrics
+    ]
+
+def _encode_payload(encoded_series: List[bytes]) -> bytes:
+    """Joins pre-serialized series entries into a {"series": [...]} body."""
+    return b'{"series":[' + b",".join(encoded_series) + b"]}"
+
+def iter_payloads(series: List[Dict]) -> Iterator[bytes]:
+    """
+    Yields gzip-compressed request bodies that respect the Datadog payload limits.
+
+    Series are packed greedily up to the decompressed limit; any batch whose
+    compressed body is still too large is split in half until it fits.
+    """
+    batch = []
+    batch_size = 0
+    for entry in series:
+        encoded = json.dumps(entry, separators=(",", ":")).encode("utf-8")
+        if batch and batch_size + len(encoded) + 1 > MAX_DECOMPRESSED_BYTES - 16:
+            yield from _compress_batch(batch)
+            batch, batch_size = [], 0
+        batch.append(encoded)
+        batch_size += len(encoded) + 1
+    if batch:
+        yield from _compress_batch(batch)
+
+def _compress_batch(batch: List[bytes]) -> Iterator[bytes]:
+    body = gzip.compress(_encode_payload(batch), compresslevel=6)
+    if len(body) <= MAX_PAYLOAD_BYTES or len(batch) == 1:
+        yield body
+        return
+    middle = len(batch) // 2
+    yield from _compress_batch(batch[:middle])
+    yield from _compress_batch(batch[middle:])
+
+def post_series_status(series: List[Dict], dd_api_key: str, timeout=REQUEST_TIMEOUT) -> str:
+    """
+    Posts series entries to Datadog in as few compressed requests as the limits allow.
+
+    Returns DELIVERED if every request succeeded, REJECTED if Datadog refused any of
+    them with a 4xx other than RETRYABLE_CLIENT_ERRORS (sending the same series again
+    cannot succeed), and RETRY otherwise. Errors are logged, not raised.
+    """
+    import requests
+    session = get_session()
+    headers = {
+        "Content-Type": "application/json",
+        "Content-Encoding": "gzip",
+        "DD-API-KEY": dd_api_key,
+    }
+    status = DELIVERED
+    for body in iter_payloads(series):
+        try:
+            response = session.post(DATADOG_SERIES_URL, data=body, headers=headers, timeout=timeout)
+            response.raise_for_status()
+            logger.info("Successfully sent %d bytes of metrics to Datadog: %s", len(body), response.status_code)
+        except requests.exceptions.HTTPError as e:
+            logger.error("Error sending metrics to Datadog: %s", e)
+            code = e.response.status_code if e.response is not None else None
+            if code is not None and 400 <= code < 500 and code not in RETRYABLE_CLIENT_ERRORS:
+                status = REJECTED
+            elif status == DELIVERED:
+                status = RETRY
+        except requests.exceptions.RequestException as e:
+            logger.error("Error sending metrics to Datadog: %s", e)
+            if status == DELIVERED:
+                status = RETRY
+    return status
+
+def post_series(series: List[Dict], dd_api_key: str, timeout=REQUEST_TIMEOUT) -> bool:
+    """Posts series entries to Datadog; returns True if every request succeeded (see post_series_status)."""
+    return post_series_status(series, dd_api_key, timeout) == DELIVERED
+
+def send_datadog_metrics(metrics: list, tags: list, dd_api_key: str, dd_app_key: str = None,
+                         run_id: Optional[str] = None) -> bool:
     """
     Sends custom metrics to Datadog using the requests library.
 
-    This function makes a POST request to the Datadog API endpoint,
-    sending the given metrics along with tags. If an error occurs during
-    the request, it logs the error.
-    
+    This function makes a gzip-compressed POST request to the Datadog API endpoint
+    over a pooled keep-alive session, sending the given metrics along with tags.
+    If an error occurs during the request, it logs the error, appends the metrics to
+    the spool (see spool.replay_spool) and returns False.
+
     If dd_app_key is provided, you might use it for further operations or custom endpoints,
     although for simple metric submissions it's generally not needed.
     """
-    # Construct the endpoint URL using the Datadog API key.
-    url = f"https://api.datadoghq.com/api/v1/series?api_key={dd_api_key}"
-    
-    timestamp = int(time.time())
-    series = []
-    for metric in metrics:
-        point = [timestamp, metric["value"]]
-        series.append({
-            "metric": metric["metric"],
-            "points": [point],
-            "tags": tags,
-            "type": "gauge"
-        })
-    
-    payload = {"series": series}
-    
-    try:
-        response = requests.post(url, json=payload)
-        response.raise_for_status()
-        logger.info("Successfully sent metrics to Datadog: %s", response.json())
-    except requests.exceptions.RequestException as e:
-        logger.error("Error sending metrics to Datadog: %s", e)
+    series = build_series(metrics, tags)
+    if post_series(series, dd_api_key):
+        return True
+    write_spool([(run_id, series)])
+    return False
+
+class MetricSubmitter:
+    """
+    Queues metrics and delivers them to Datadog from a background thread.
+
+    submit() only appends to an in-memory buffer, so the caller never waits on
+    the HTTP round trip. The thread coalesces everything queued within
+    flush_interval into one batched submission. close() waits at most
+    time_budget seconds for pending metrics. Metrics that fail to send, or are
+    still unconfirmed when the budget runs out, are written to the spool.
+    """
+
+    def __init__(self, dd_api_key: str, dd_app_key: Optional[str] = None,
+                 flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+                 time_budget: float = DEFAULT_TIME_BUDGET):
+        self.dd_api_key = dd_api_key
+        self.dd_app_key = dd_app_key
+        self.flush_interval = flush_interval
+        self.time_budget = time_budget
+        # Queued and in-flight reports, as (run_id, series) records.
+        self._pending = []
+        self._in_flight = []
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = None
+
+    def submit(self, metrics: list, tags: list, timestamp: Optional[int] = None,
+               run_id: Optional[str] = None) -> None:
+        """Queues metrics for background delivery and returns immediately."""
+        series = build_series(metrics, tags, timestamp)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("MetricSubmitter is closed")
+            self._pending.append((run_id, series))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="dd-mlops-costs-submitter", daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending and self._closed:
+                    return
+                if not self._closed:
+                    # Give other callers a short window to add to the same batch.
+                    self._cond.wait(self.flush_interval)
+                batch, self._pending = self._pending, []
+                self._in_flight = batch
+            try:
+                delivered = post_series([entry for _, series in batch for entry in series], self.dd_api_key)
+            except Exception as e:
+                logger.error("Unexpected error in Datadog submitter: %s", e)
+                delivered = False
+            with self._cond:
+                # close() may already have spooled this batch after its budget ran out.
+                spool = not delivered and self._in_flight is batch
+            if spool:
+                # Spool before the batch stops counting as in flight, so a flush() or
+                # close() that returns afterwards knows the batch is on disk.
+                write_spool(batch)
+            with self._cond:
+                if self._in_flight is batch:
+                    self._in_flight = []
+                self._cond.notify_all()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Blocks until all queued metrics were handed to Datadog or timeout elapses.
+
+        Returns True if nothing is left pending.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self._cond.notify_all()
+            while self._pending or self._in_flight:
+                if self._thread is None:
+                    break
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return not (self._pending or self._in_flight)
+
+    def _stop_accepting(self) -> None:
+        """Rejects further submits and wakes the thread to send what is queued without waiting."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def close(self, timeout: Optional[float] = None) -> bool:
+        """
+        Stops accepting metrics and flushes within the time budget.
+
+        Metrics still pending or in flight when the budget runs out are spooled, so
+        shutdown never waits longer than the budget and no report is lost. A batch
+        that was in flight may then reach Datadog twice; replay deduplicates spooled
+        records, and a repeated gauge point with the same timestamp is idempotent.
+        """
+        if timeout is None:
+            timeout = self.time_budget
+        self._stop_accepting()
+        delivered = self.flush(timeout)
+        if not delivered:
+            with self._cond:
+                unconfirmed = self._in_flight + self._pending
+                self._pending, self._in_flight = [], []
+            logger.warning("Datadog submitter exceeded its %.1fs budget; spooling %d reports", timeout, len(unconfirmed))
+            write_spool(unconfirmed)
+        return delivered
+
+class CollectorClient:
+    """
+    Sends metrics to a local dd_mlops_costs collector instead of Datadog.
+
+    Each submit() is a single fire-and-forget UDP datagram, so it never blocks
+    the job; the collector aggregates events and owns the Datadog API key.
+    Exposes the same submit() interface as MetricSubmitter.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = DEFAULT_COLLECTOR_PORT):
+        self.address = (host, port)
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._sock.setblocking(False)
+
+    def submit(self, metrics: list, tags: list, timestamp: Optional[int] = None,
+               run_id: Optional[str] = None) -> None:
+        """
+        Sends metrics as one event per tag set (metrics with their own "tags" form
+        separate events); the collector stamps events with its window time.
+        """
+        events: Dict[tuple, Dict] = {}
+        for metric in metrics:
+            extra_tags = tuple(metric.get("tags", ()))
+            event = events.get(extra_tags)
+            if event is None:
+                event = events[extra_tags] = {"tags": tags + list(extra_tags), "values": {}}
+            event["values"][metric["metric"]] = metric["value"]
+        for event in events.values():
+            try:
+                self._sock.sendto(json.dumps(event, separators=(",", ":")).encode("utf-8"), self.address)
+            except OSError as e:
+                logger.error("Error sending metrics to collector %s:%d: %s", self.address[0], self.address[1], e)
+
+_COLLECTOR_CLIENT = None
+
+def get_collector_client() -> Optional[CollectorClient]:
+    """
+    Returns a CollectorClient if DD_MLOPS_COLLECTOR_ADDR ("host:port" or "host") is set, else None.
+    """
+    global _COLLECTOR_CLIENT
+    address = os.environ.get(COLLECTOR_ENV_VAR)
+    if not address:
+        return None
+    if _COLLECTOR_CLIENT is None:
+        host, _, port = address.rpartition(":") if ":" in address else (address, "", "")
+        _COLLECTOR_CLIENT = CollectorClient(host, int(port) if port else DEFAULT_COLLECTOR_PORT)
+    return _COLLECTOR_CLIENT
+
+_SUBMITTERS: Dict[str, MetricSubmitter] = {}
+_SUBMITTERS_LOCK = threading.Lock()
+
+def get_submitter(dd_api_key: str, dd_app_key: Optional[str] = None) -> MetricSubmitter:
+    """
+    Returns the shared MetricSubmitter for an API key, creating it on first use.
+
+    Submitters are closed automatically at interpreter exit, which bounds the
+    time spent on delivery to their time budget.
+    """
+    with _SUBMITTERS_LOCK:
+        submitter = _SUBMITTERS.get(dd_api_key)
+        if submitter is None:
+            submitter = MetricSubmitter(dd_api_key, dd_app_key)
+            _SUBMITTERS[dd_api_key] = submitter
+    return submitter
+
+def close_submitters(timeout: Optional[float] = None) -> None:
+    """
+    Flushes and closes every shared submitter within one overall budget.
+
+    timeout (default DEFAULT_TIME_BUDGET) is shared: all submitters are closed first
+    and then flushed against a single deadline, so shutdown takes at most timeout
+    seconds however many API keys were used.
+    """
+    if timeout is None:
+        timeout = DEFAULT_TIME_BUDGET
+    deadline = time.monotonic() + timeout
+    with _SUBMITTERS_LOCK:
+        submitters = list(_SUBMITTERS.values())
+        _SUBMITTERS.clear()
+    for submitter in submitters:
+        # Stop every submitter first so they all flush concurrently.
+        submitter._stop_accepting()
+    for submitter in submitters:
+        submitter.close(max(0.0, deadline - time.monotonic()))
+
+atexit.register(close_submitters)
@@ -0,0 +1,216 @@
+import json
+import math
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+from .utils import get_region
+from .pricing import get_emr_instance_price, get_emr_service_fee
+
+logger = logging.getLogger(__name__)
+
+JOB_FLOW_PATH = '/mnt/var/lib/info/job-flow.json'
+DEFAULT_MAX_WORKERS = 8
+# Resolution of the instance-count timeline used for peak concurrency.
+TIMELINE_BUCKET_SECONDS = 60
+
+class InstanceUsage:
+    """
+    Streaming accumulator of instance intervals clipped to a cost window.
+
+    Each interval adds its exact overlap with the window to the instance-seconds of
+    its type and marks its start and end in a difference array over fixed buckets.
+    Sweeping that array gives the instance count over time. Memory depends on the
+    number of instance types and the window length, not on the number of instances.
+    """
+
+    def __init__(self, window_start: float, window_end: float,
+                 bucket_seconds: float = TIMELINE_BUCKET_SECONDS):
+        self.window_start = window_start
+        self.window_end = window_end
+        self.bucket_seconds = bucket_seconds
+        self.instance_seconds: Dict[str, float] = {}
+        self.instances = 0
+        n_buckets = max(1, math.ceil((window_end - window_start) / bucket_seconds))
+        self._delta = [0] * (n_buckets + 1)
+
+    def add(self, instance_type: str, start: float, end: float) -> None:
+        start = max(start, self.window_start)
+        end = min(end, self.window_end)
+        if end <= start:
+            return
+        self.instance_seconds[instance_type] = self.instance_seconds.get(instance_type, 0.0) + (end - start)
+        self.instances += 1
+        first = int((start - self.window_start) // self.bucket_seconds)
+        last = min(len(self._delta) - 1, math.ceil((end - self.window_start) / self.bucket_seconds))
+        self._delta[first] += 1
+        self._delta[last] -= 1
+
+    def merge(self, other: "InstanceUsage") -> None:
+        for instance_type, seconds in other.instance_seconds.items():
+            self.instance_seconds[instance_type] = self.instance_seconds.get(instance_type, 0.0) + seconds
+        self.instances += other.instances
+        for i, delta in enumerate(other._delta):
+            self._delta[i] += delta
+
+    def timeline(self) -> Iterator[int]:
+        """Sweeps the difference array, yielding the instance count in each bucket."""
+        running = 0
+        for delta in self._delta[:-1]:
+            running += delta
+            yield running
+
+    def peak_instances(self) -> int:
+        return max(self.timeline(), default=0)
+
+    def avg_instances(self) -> float:
+        window = self.window_end - self.window_start
+        return sum(self.instance_seconds.values()) / window if window > 0 else 0.0
+
+def make_emr_client(region: str):
+    """Creates an EMR client with adaptive retries, which back off on throttling errors."""
+    import boto3
+    from botocore.config import Config
+    config = Config(retries={"mode": "adaptive", "max_attempts": 10}, max_pool_connections=DEFAULT_MAX_WORKERS)
+    return boto3.client("emr", region_name=region, config=config)
+
+def _paginate(call, key: str, **kwargs) -> Iterator[Dict]:
+    """Follows EMR Marker pagination, yielding items one page at a time."""
+    while True:
+        response = call(**kwargs)
+        yield from response.get(key, [])
+        marker = response.get("Marker")
+        if not marker:
+            return
+        kwargs["Marker"] = marker
+
+def _instance_interval(instance: Dict, now: float) -> Optional[Tuple[str, float, float]]:
+    timeline = instance.get("Status", {}).get("Timeline", {})
+    created = timeline.get("CreationDateTime")
+    if created is None:
+        return None
+    ended = timeline.get("EndDateTime")
+    return instance["InstanceType"], created.timestamp(), ended.timestamp() if ended else now
+
+def collect_instance_usage(emr, cluster_id: str, window_start: float, window_end: float,
+                           group_filter: Dict[str, str], now: float) -> InstanceUsage:
+    """Streams list_instances for one instance group or fleet into an InstanceUsage."""
+    usage = InstanceUsage(window_start, window_end)
+    for instance in _paginate(emr.list_instances, "Instances", ClusterId=cluster_id, **group_filter):
+        interval = _instance_interval(instance, now)
+        if interval is not None:
+            usage.add(*interval)
+    return usage
+
+def read_cluster_id() -> str:
+    try:
+        with open(JOB_FLOW_PATH, 'r') as f:
+            return json.load(f).get('jobFlowId', 'unknown_cluster')
+    except Exception as e:
+        logger.error("Error reading EMR job-flow.json: %s", e)
+        return 'unknown_cluster'
+
+def gather_emr_job_data(
+    window_start: Optional[float] = None,
+    window_end: Optional[float] = None,
+    emr=None,
+    max_workers: int = DEFAULT_MAX_WORKERS
+) -> Dict:
+    """
+    Retrieves EMR cluster metadata and per-type instance-seconds within a time window.
+
+    The window (epoch seconds) defaults to the cluster's whole life up to now. Instance
+    groups or fleets are listed first; list_instances is then paged for each of them
+    concurrently, and every instance's creation/end interval is folded straight into an
+    InstanceUsage, so instance records are never all held in memory. Prices for the
+    configured instance types are prefetched alongside the listing.
+
+    If the cluster or its instances cannot be listed, instance_seconds is None so the
+    cost is reported as unavailable rather than as zero.
+    """
+    data = {'cluster_id': read_cluster_id(), 'region': get_region()}
+    now = time.time()
+    try:
+        emr = emr or make_emr_client(data['region'])
+        cluster = emr.describe_cluster(ClusterId=data['cluster_id'])['Cluster']
+        data['release_label'] = cluster.get('ReleaseLabel', 'unknown')
+        if window_start is None:
+            window_start = cluster['Status']['Timeline']['CreationDateTime'].timestamp()
+        if window_end is None:
+            window_end = now
+
+        if cluster.get('InstanceCollectionType') == 'INSTANCE_FLEET':
+            fleets = list(_paginate(emr.list_instance_fleets, "InstanceFleets", ClusterId=data['cluster_id']))
+            group_filters = [{"InstanceFleetId": fleet["Id"]} for fleet in fleets]
+            instance_types = {spec["InstanceType"] for fleet in fleets
+                              for spec in fleet.get("InstanceTypeSpecifications", [])}
+        else:
+            groups = list(_paginate(emr.list_instance_groups, "InstanceGroups", ClusterId=data['cluster_id']))
+            group_filters = [{"InstanceGroupId": group["Id"]} for group in groups]
+            instance_types = {group["InstanceType"] for group in groups}
+
+        usage = InstanceUsage(window_start, window_end)
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            prices = pool.submit(prefetch_prices, data['region'], instance_types)
+            futures = [
+                pool.submit(collect_instance_usage, emr, data['cluster_id'], window_start, window_end, group_filter, now)
+                for group_filter in group_filters
+            ]
+            for future in futures:
+                usage.merge(future.result())
+            data['prices'] = prices.result()
+
+        data['instance_types'] = sorted(instance_types | set(usage.instance_seconds))
+        data['instance_seconds'] = usage.instance_seconds
+        data['peak_instances'] = usage.peak_instances()
+        data['avg_instances'] = usage.avg_instances()
+    except Exception as e:
+        logger.error("Could not retrieve EMR cluster details via boto3: %s", e)
+        data['instance_types'] = []
+        data['instance_seconds'] = None
+        return data
+
+    logger.info("EMR job data: cluster %s, %d instance types, %.1f instance-hours",
+                data['cluster_id'], len(data['instance_types']), sum(data['instance_seconds'].values()) / 3600)
+    return data
+
+def prefetch_prices(region: str, instance_types: Iterable[str]) -> Dict[str, Tuple[Optional[float], Optional[float]]]:
+    """Looks up (EC2 price, EMR fee) per hour for every instance type in one pass; unknown prices are None."""
+    return {
+        instance_type: (get_emr_instance_price(region, instance_type), get_emr_service_fee(region, instance_type))
+        for instance_type in set(instance_types)
+    }
+
+def calculate_emr_cost(resource_data: Dict, duration_seconds: float) -> float:
+    """
+    Calculates the EMR job cost from the instance-seconds of each type:
+       cost = Σ[(instance_price + emr_fee) * instance_seconds / 3600]
+
+    Each instance is billed only for the part of its life inside the cost window, so
+    clusters that scale up and down are priced correctly. Spot instances are priced at
+    the on-demand rate. duration_seconds is only used for logging.
+
+    Raises ValueError when the instance data could not be retrieved or an instance type
+    has no EC2 price or EMR fee, so a missing price is never reported as a $0 cost.
+    """
+    region = resource_data.get("region")
+    instance_seconds = resource_data.get("instance_seconds")
+    if instance_seconds is None:
+        raise ValueError(f"EMR instance data unavailable for cluster {resource_data.get('cluster_id')}")
+    prices = dict(resource_data.get("prices", {}))
+    missing = [instance_type for instance_type in instance_seconds if instance_type not in prices]
+    if missing:
+        prices.update(prefetch_prices(region, missing))
+    unpriced = sorted(instance_type for instance_type in instance_seconds if None in prices[instance_type])
+    if unpriced:
+        raise ValueError(f"No EMR pricing for {', '.join(unpriced)} in {region}; build a pricing catalog "
+                         "(see pricing_catalog) that covers them")
+    total_cost = 0.0
+    for instance_type, seconds in instance_seconds.items():
+        instance_price, fee = prices[instance_type]
+        cost = (instance_price + fee) * seconds / 3600
+        total_cost += cost
+        logger.info("EMR cost for %s: %.2f instance-hours at (price: %.3f, fee: %.3f) = %.4f",
+                    instance_type, seconds / 3600, instance_price, fee, cost)
+    logger.info("Calculated EMR cost for %d sec => cost $%.4f", duration_seconds, total_cost)
+    return total_cost
@@ -1,47 +1,26 @@
-import os
-import sys
 import logging
-import boto3
 from typing import Dict
-from .utils import get_region
-from .pricing import get_glue_price, GLUE_WORKER_DPUS
+from .job_context import resolve_job_context
+from .pricing import get_glue_price, GLUE_WORKER_DPUS, FLEX_EXECUTION_CLASS
 
 logger = logging.getLogger(__name__)
 
 def gather_glue_job_data() -> Dict:
     """
     Retrieves Glue job metadata.
-    
-    Attempts to use awsglue.utils for parameters; falls back to environment variables.
-    Also attempts to fetch details via the Glue API.
+
+    Uses the job arguments and environment variables first; the Glue API is only called
+    when they do not identify the worker configuration, and its answer is cached on disk
+    (see job_context.resolve_job_context).
     """
-    data = {}
-    try:
-        from awsglue.utils import getResolvedOptions
-        args = getResolvedOptions(sys.argv, ['JOB_NAME'])
-        data['job_name'] = args.get('JOB_NAME')
-    except Exception as e:
-        logger.warning("Could not retrieve Glue parameters via awsglue.utils: %s", e)
-        data['job_name'] = os.environ.get("JOB_NAME", "unknown_glue_job")
-    
-    data['region'] = get_region()
-    try:
-        glue = boto3.client('glue', region_name=data['region'])
-        job_details = glue.get_job(JobName=data['job_name'])
-        data['worker_type'] = job_details['Job'].get('WorkerType', os.environ.get("GLUE_WORKER_TYPE", "G.1X"))
-        data['number_of_workers'] = int(job_details['Job'].get('NumberOfWorkers', os.environ.get("GLUE_NUMBER_OF_WORKERS", 1)))
-    except Exception as e:
-        logger.warning("Unable to retrieve Glue job details via API: %s", e)
-        data['worker_type'] = os.environ.get("GLUE_WORKER_TYPE", "G.1X")
-        data['number_of_workers'] = int(os.environ.get("GLUE_NUMBER_OF_WORKERS", 1))
-    
-    logger.info("Glue job data: %s", data)
-    return data
+    return dict(resolve_job_context())
 
 def calculate_glue_cost(resource_data: Dict, duration_seconds: float) -> float:
     """
     Calculates Glue job cost using:
        cost = (number_of_workers * DPUs per worker * (duration_seconds / 3600)) * price per DPU-hour
+
+    The Flex rate is used when resource_data has execution_class FLEX.
     """
     worker_type = resource_data.get("worker_type")
     num_workers = resource_data.get("number_of_workers", 1)
@@ -51,8 +30,77 @@ def calculate_glue_cost(resource_data: Dict, duration_seconds: float) -> float:
     if dpu_per_worker is None:
         raise ValueError(f"Unknown Glue worker type: {worker_type}")
     
-    price = get_glue_price(region, worker_type)
+    price = get_glue_price(region, worker_type, resource_data.get("execution_class"))
     cost = num_workers * dpu_per_worker * (duration_seconds / 3600) * price
     logger.info("Calculated Glue cost: %d workers of type %s (%.2f DPUs) for %d sec at $%.3f per DPU-hour => cost $%.4f",
                 num_workers, worker_type, dpu_per_worker, duration_seconds, price, cost)
     return cost
+
+def calculate_glue_costs(df, dpu_seconds_column: str = "dpu_seconds",
+                         execution_class_column: str = "execution_class"):
+    """
+    Vectorized batch version of calculate_glue_cost for many job runs at once.
+
+    Expects a pandas DataFrame with the columns:
+       - worker_type, region
+       - number_of_workers (defaults to 1 when absent or null)
+       - duration_seconds and/or dpu_seconds (Glue's DPUSeconds)
+       - execution_class (optional; FLEX rows are priced at the Flex DPU-hour rate, other
+         values and nulls at the standard rate)
+
+    Rows with dpu_seconds are priced as dpu_seconds / 3600 * price per DPU-hour, which is
+    exact for auto-scaled runs; other rows use the same formula as calculate_glue_cost.
+    Raises ValueError for rows that cannot be priced: an unknown worker type, or neither
+    duration_seconds nor dpu_seconds.
+    Worker types and regions are factorized once and priced through lookup arrays built from
+    GLUE_WORKER_DPUS and get_glue_price (one column per execution class), so the cost is
+    computed in a single numpy pass.
+
+    Returns a float Series of costs aligned with df's index.
+    """
+    import numpy as np
+    import pandas as pd
+
+    worker_types = list(GLUE_WORKER_DPUS)
+    dpu_lookup = np.append(np.array([GLUE_WORKER_DPUS[w] for w in worker_types], dtype=float), np.nan)
+    worker_codes = pd.Index(worker_types).get_indexer(df["worker_type"])
+    dpu_per_worker = dpu_lookup[worker_codes]
+
+    region_codes, regions = pd.factorize(df["region"].fillna("unknown"))
+    if execution_class_column in df:
+        is_flex = df[execution_class_column].fillna("").astype(str).str.upper().eq(FLEX_EXECUTION_CLASS).to_numpy()
+    else:
+        is_flex = np.zeros(len(df), dtype=bool)
+    execution_classes = [None, FLEX_EXECUTION_CLASS] if is_flex.any() else [None]
+    price_lookup = np.array([[get_glue_price(region, None, execution_class) for execution_class in execution_classes]
+                             for region in regions], dtype=float).reshape(len(regions), len(execution_classes))
+    price = price_lookup[region_codes, is_flex.astype(int)]
+
+    if "number_of_workers" in df:
+        num_workers = df["number_of_workers"].fillna(1).to_numpy(dtype=float)
+    else:
+        num_workers = np.ones(len(df))
+    if "duration_seconds" in df:
+        duration_seconds = df["duration_seconds"].to_numpy(dtype=float)
+    else:
+        duration_seconds = np.full(len(df), np.nan)
+    if dpu_seconds_column in df:
+        dpu_seconds = df[dpu_seconds_column].to_numpy(dtype=float)
+    else:
+        dpu_seconds = np.full(len(df), np.nan)
+
+    has_dpu_seconds = ~np.isnan(dpu_seconds)
+    unknown = (worker_codes == -1) & ~has_dpu_seconds
+    if unknown.any():
+        bad = sorted(set(map(str, df["worker_type"].to_numpy()[unknown])))
+        raise ValueError(f"Unknown Glue worker type(s): {', '.join(bad)}")
+    missing = np.isnan(duration_seconds) & ~has_dpu_seconds
+    if missing.any():
+        raise ValueError(f"{int(missing.sum())} row(s) have neither duration_seconds nor {dpu_seconds_column}, "
+                         f"e.g. index {df.index[missing][:5].tolist()}")
+
+    dpu_hours = np.where(has_dpu_seconds, dpu_seconds, num_workers * dpu_per_worker * duration_seconds) / 3600
+    cost = dpu_hours * price
+    logger.info("Calculated Glue cost for %d job runs across %d regions => total cost $%.4f",
+                len(df), len(regions), cost.sum())
+    return pd.Series(cost, index=df.index, name="cost")
@@ -0,0 +1,136 @@
+import os
+import sys
+import json
+import time
+import logging
+import functools
+from typing import Dict, List, Optional
+from .utils import get_region
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR_ENV_VAR = "DD_MLOPS_CACHE_DIR"
+CACHE_TTL_ENV_VAR = "DD_MLOPS_JOB_CACHE_TTL"
+# Only persists where the home directory outlives the process (EMR nodes, long-lived
+# hosts); every Glue run starts on a fresh container, so there the cache never hits.
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "dd_mlops_costs")
+# Glue does not pass a job version to the script, so without one a cached answer is
+# only trusted briefly; with an explicit JOB_VERSION it is keyed to that version.
+DEFAULT_CACHE_TTL_SECONDS = 3600
+DEFAULT_VERSIONED_CACHE_TTL_SECONDS = 7 * 24 * 3600
+CACHE_FILE_NAME = "job_context.json"
+
+def parse_job_arguments(argv: Optional[List[str]] = None) -> Dict[str, str]:
+    """
+    Parses Glue-style job arguments (--KEY value or --KEY=value) from argv.
+
+    This reads the same arguments as awsglue.utils.getResolvedOptions without
+    importing awsglue or requiring every key to be present.
+    """
+    argv = sys.argv[1:] if argv is None else argv
+    args = {}
+    i = 0
+    while i < len(argv):
+        arg = argv[i]
+        if arg.startswith("--"):
+            key, sep, value = arg[2:].partition("=")
+            if not sep and i + 1 < len(argv) and not argv[i + 1].startswith("--"):
+                value = argv[i + 1]
+                i += 1
+            args[key] = value
+        i += 1
+    return args
+
+def _cache_path() -> str:
+    return os.path.join(os.environ.get(CACHE_DIR_ENV_VAR, DEFAULT_CACHE_DIR), CACHE_FILE_NAME)
+
+def _read_cache() -> Dict:
+    try:
+        with open(_cache_path(), "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _write_cache(key: str, entry: Dict) -> None:
+    path = _cache_path()
+    cache = _read_cache()
+    cache[key] = entry
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp.{os.getpid()}"
+        with open(tmp_path, "w") as f:
+            json.dump(cache, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning("Unable to write job context cache %s: %s", path, e)
+
+def fetch_job_details(job_name: str, region: str, glue=None) -> Dict:
+    """Reads the job's WorkerType and NumberOfWorkers with glue.get_job."""
+    if glue is None:
+        import boto3
+        glue = boto3.client('glue', region_name=region)
+    job = glue.get_job(JobName=job_name)['Job']
+    details = {}
+    if job.get('WorkerType'):
+        details['worker_type'] = job['WorkerType']
+    if job.get('NumberOfWorkers'):
+        details['number_of_workers'] = int(job['NumberOfWorkers'])
+    return details
+
+@functools.lru_cache(maxsize=1)
+def resolve_job_context() -> Dict:
+    """
+    Resolves job name, run id, region, worker type and worker count as cheaply as possible.
+
+    Sources, in order:
+      1. Job arguments and environment variables. Glue itself passes --JOB_NAME and
+         --JOB_RUN_ID. --WORKER_TYPE, --NUMBER_OF_WORKERS and --JOB_VERSION are not set
+         by Glue; add them as job parameters to skip the lookups below. The
+         JOB_NAME / JOB_RUN_ID / GLUE_WORKER_TYPE / GLUE_NUMBER_OF_WORKERS / JOB_VERSION
+         environment variables are read as well.
+      2. An on-disk cache keyed by region, job name and job version. Without a
+         job version an entry is trusted for 1 hour, so a change of WorkerType or
+         NumberOfWorkers is picked up within that time; with one, for 7 days, so
+         bump the version whenever the worker configuration changes.
+         DD_MLOPS_JOB_CACHE_TTL (seconds) overrides both. The cache lives under
+         DD_MLOPS_CACHE_DIR (default ~/.cache/dd_mlops_costs), which Glue discards
+         after every run, so on Glue it never hits: pass --WORKER_TYPE and
+         --NUMBER_OF_WORKERS there instead.
+      3. The Glue get_job API, whose answer is written back to the cache.
+    Anything still missing falls back to G.1X with 1 worker.
+
+    The result is resolved once per process; callers receive a shared dict and should copy it
+    before modifying it.
+    """
+    args = parse_job_arguments()
+    data = {
+        'job_name': args.get('JOB_NAME') or os.environ.get("JOB_NAME", "unknown_glue_job"),
+        'job_run_id': args.get('JOB_RUN_ID') or os.environ.get("JOB_RUN_ID"),
+        'region': get_region(),
+    }
+    worker_type = args.get('WORKER_TYPE') or os.environ.get("GLUE_WORKER_TYPE")
+    number_of_workers = args.get('NUMBER_OF_WORKERS') or os.environ.get("GLUE_NUMBER_OF_WORKERS")
+
+    if not (worker_type and number_of_workers):
+        job_version = args.get('JOB_VERSION') or os.environ.get("JOB_VERSION", "")
+        cache_key = f"{data['region']}|{data['job_name']}|{job_version}"
+        default_ttl = DEFAULT_VERSIONED_CACHE_TTL_SECONDS if job_version else DEFAULT_CACHE_TTL_SECONDS
+        ttl = float(os.environ.get(CACHE_TTL_ENV_VAR, default_ttl))
+        cached = _read_cache().get(cache_key)
+        if cached and time.time() - cached.get('cached_at', 0) <= ttl:
+            details = cached
+            logger.info("Using cached Glue job details for %s", data['job_name'])
+        else:
+            try:
+                details = fetch_job_details(data['job_name'], data['region'])
+                _write_cache(cache_key, dict(details, cached_at=time.time()))
+            except Exception as e:
+                logger.warning("Unable to retrieve Glue job details via API: %s", e)
+                details = {}
+        worker_type = worker_type or details.get('worker_type')
+        number_of_workers = number_of_workers or details.get('number_of_workers')
+
+    data['worker_type'] = worker_type or "G.1X"
+    data['number_of_workers'] = int(number_of_workers or 1)
+    logger.info("Glue job data: %s", data)
+    return data
@@ -1,9 +1,8 @@
 import functools
-import boto3
-import json
 import logging
 import time
-import jmespath
+from typing import Optional
+from .pricing_catalog import get_catalog, GLUE, EC2, EMR, GLUE_ETL_DPU_HOUR, GLUE_ETL_FLEX_DPU_HOUR
 
 logger = logging.getLogger(__name__)
 
@@ -23,12 +22,64 @@ GLUE_PRICE_PER_DPU_HOUR = {
     'sa-east-1': 0.69,
 }
 
-def get_glue_price(region: str, worker_type: str) -> float:
+# Glue job runs with ExecutionClass FLEX are billed at a discounted DPU-hour rate.
+FLEX_EXECUTION_CLASS = "FLEX"
+GLUE_FLEX_PRICE_PER_DPU_HOUR = {
+    'us-east-1': 0.29,
+    'us-west-1': 0.29,
+    'sa-east-1': 0.46,
+}
+
+# --- Static EMR Pricing: used when the pricing catalog has no entry ---
+STATIC_EMR_INSTANCE_PRICES = {
+    'us-east-1': {
+        'm5.xlarge': 0.192,
+        'm5.2xlarge': 0.384,
+    },
+    'us-west-1': {
+        'm5.xlarge': 0.224,
+        'm5.2xlarge': 0.448,
+    },
+    'sa-east-1': {
+        'm5.xlarge': 0.306,
+        'm5.2xlarge': 0.612,
+    },
+}
+
+STATIC_EMR_SERVICE_FEE = {
+    'us-east-1': {
+        'm5.xlarge': 0.048,
+        'm5.2xlarge': 0.096,
+    },
+    'us-west-1': {
+        'm5.xlarge': 0.048,
+        'm5.2xlarge': 0.096,
+    },
+    'sa-east-1': {
+        'm5.xlarge': 0.048,
+        'm5.2xlarge': 0.096,
+    },
+}
+
+def get_glue_price(region: str, worker_type: str, execution_class: Optional[str] = None) -> float:
     """
-    Returns the price per DPU-hour for the given region.
-    Currently uses a static mapping as dynamic pricing for Glue DPUs is not reliably available.
+    Returns the price per DPU-hour for the given region and execution class.
+
+    Looks the price up in the local pricing catalog (see pricing_catalog) when one
+    has been built, and otherwise uses the static mapping. FLEX runs use the Flex
+    rate; if a region has no Flex price the standard rate is used, with a warning.
     """
-    price = GLUE_PRICE_PER_DPU_HOUR.get(region)
+    catalog = get_catalog()
+    if (execution_class or "").upper() == FLEX_EXECUTION_CLASS:
+        price = catalog.lookup(GLUE, region, GLUE_ETL_FLEX_DPU_HOUR) if catalog is not None else None
+        if price is None:
+            price = GLUE_FLEX_PRICE_PER_DPU_HOUR.get(region)
+        if price is not None:
+            return price
+        logger.warning("No Glue Flex pricing data for region %s; using the standard rate", region)
+    price = catalog.lookup(GLUE, region, GLUE_ETL_DPU_HOUR) if catalog is not None else None
+    if price is None:
+        price = GLUE_PRICE_PER_DPU_HOUR.get(region)
     if price is None:
         logger.warning("No Glue pricing data for region %s; defaulting to 0.44", region)
         price = 0.44
@@ -56,4 +107,32 @@ def retry(func):
                     delay *= 2
                 else:
                     raise e
-    return wrapper
\ No newline at end of file
+    return wrapper
+
+def get_emr_instance_price(region: str, instance_type: str) -> Optional[float]:
+    """
+    Returns the on-demand EC2 price per hour for an instance type used by EMR.
+
+    Served from the local pricing catalog, falling back to the static mapping.
+    Returns None when neither knows the instance type, rather than guessing a price.
+    """
+    catalog = get_catalog()
+    price = catalog.lookup(EC2, region, instance_type) if catalog is not None else None
+    if price is None:
+        price = STATIC_EMR_INSTANCE_PRICES.get(region, {}).get(instance_type)
+    if price is None:
+        logger.warning("No EC2 pricing data for %s in %s", instance_type, region)
+    return price
+
+def get_emr_service_fee(region: str, instance_type: str) -> Optional[float]:
+    """
+    Returns the EMR service fee per instance-hour from the pricing catalog or the static
+    mapping, or None when neither knows the instance type.
+    """
+    catalog = get_catalog()
+    fee = catalog.lookup(EMR, region, instance_type) if catalog is not None else None
+    if fee is None:
+        fee = STATIC_EMR_SERVICE_FEE.get(region, {}).get(instance_type)
+    if fee is None:
+        logger.warning("No EMR service fee data for %s in %s", instance_type, region)
+    return fee
@@ -0,0 +1,327 @@
+"""
+Local pricing catalog compiled from the AWS bulk price-list files.
+
+The AWS offer files (one JSON document per service and region) are parsed offline
+and compiled into a small binary file that holds an open-addressing hash table of
+(service, region, key) -> USD price per hour. At job time the file is memory-mapped
+and each lookup is a couple of struct reads, with no Pricing API call and no JSON
+parsing.
+
+Build or refresh a catalog with:
+    python -m dd_mlops_costs.pricing_catalog -o pricing.ddpc --service AWSGlue --region us-east-1
+"""
+import os
+import re
+import sys
+import json
+import mmap
+import time
+import struct
+import hashlib
+import logging
+import functools
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+OFFER_URL = "https://pricing.us-east-1.amazonaws.com/offers/v1.0/aws/{service_code}/current/{region}/index.json"
+
+CATALOG_ENV_VAR = "DD_MLOPS_PRICING_CATALOG"
+TTL_ENV_VAR = "DD_MLOPS_PRICING_TTL"
+DEFAULT_CATALOG_PATH = os.path.join(os.path.expanduser("~"), ".cache", "dd_mlops_costs", "pricing.ddpc")
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600
+
+# --- Catalog services ---
+GLUE = "glue"
+EC2 = "ec2"
+EMR = "emr"
+
+# Keys used for the standard and Flex Glue ETL DPU-hour rates.
+GLUE_ETL_DPU_HOUR = "ETL-DPU-Hour"
+GLUE_ETL_FLEX_DPU_HOUR = "ETL-Flex-DPU-Hour"
+
+HOURLY_UNITS = {"Hrs", "Hours", "hours", "DPU-Hour", "DPU-Hours"}
+
+# Used when an offer file predates the regionCode attribute.
+REGION_LOCATIONS = {
+    'US East (N. Virginia)': 'us-east-1',
+    'US East (Ohio)': 'us-east-2',
+    'US West (N. California)': 'us-west-1',
+    'US West (Oregon)': 'us-west-2',
+    'South America (Sao Paulo)': 'sa-east-1',
+    'South America (São Paulo)': 'sa-east-1',
+    'EU (Ireland)': 'eu-west-1',
+    'EU (Frankfurt)': 'eu-central-1',
+}
+
+# --- On-disk layout ---
+# header: magic, format version, reserved, built_at (epoch seconds), slot count, entry count
+_MAGIC = b"DDPC"
+_VERSION = 1
+_HEADER = struct.Struct("<4sHHdII")
+# slot: key hash, key offset, key length, price
+_SLOT = struct.Struct("<QIId")
+
+# Glue usage types carry a region prefix such as USE1-, APN1- or EU-, and some
+# regions have none. ETL rates are matched from their own token so that no prefix
+# shape can swallow or leak into the key.
+_ETL_USAGE = re.compile(r"(?:^|-)(ETL-(?:[A-Za-z]+-)*DPU-Hour)$")
+_USAGE_PREFIX = re.compile(r"^[A-Z]{2,4}\d?-")
+
+class CatalogError(ValueError):
+    """Raised when a catalog file is missing, truncated or of an unknown format."""
+
+def _catalog_key(service: str, region: str, key: str) -> bytes:
+    return f"{service}|{region}|{key}".encode("utf-8")
+
+def _hash_key(key: bytes) -> int:
+    # Zero marks an empty slot, so it is never used as a real hash.
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little") or 1
+
+def _hourly_usd_price(terms: Dict) -> Optional[float]:
+    """Returns the first hourly USD on-demand price in an offer's term block."""
+    for term in terms.values():
+        for dimension in term.get("priceDimensions", {}).values():
+            if dimension.get("unit") not in HOURLY_UNITS:
+                continue
+            usd = dimension.get("pricePerUnit", {}).get("USD")
+            if usd is not None:
+                return float(usd)
+    return None
+
+def _glue_usage_type(usage_type: str) -> Optional[str]:
+    """Returns a Glue DPU-hour usage type without its region prefix, or None for other usage."""
+    match = _ETL_USAGE.search(usage_type)
+    if match:
+        return match.group(1)
+    if usage_type.endswith("DPU-Hour"):
+        return _USAGE_PREFIX.sub("", usage_type)
+    return None
+
+def _product_key(product: Dict) -> Optional[Tuple[str, str, str]]:
+    """
+    Maps a price-list product to its catalog key, or None if the product is not tracked.
+
+    Tracked products are Glue DPU-hours, shared-tenancy Linux EC2 instances and
+    the EMR per-instance service fee.
+    """
+    attributes = product.get("attributes", {})
+    region = attributes.get("regionCode") or REGION_LOCATIONS.get(attributes.get("location"))
+    if not region:
+        return None
+    service_code = attributes.get("servicecode")
+    if service_code == "AWSGlue":
+        usage_type = _glue_usage_type(attributes.get("usagetype", ""))
+        if usage_type:
+            return GLUE, region, usage_type
+    elif service_code == "AmazonEC2":
+        if (attributes.get("instanceType")
+                and attributes.get("operatingSystem") == "Linux"
+                and attributes.get("tenancy") == "Shared"
+                and attributes.get("preInstalledSw") == "NA"
+                and attributes.get("capacitystatus", "Used") == "Used"):
+            return EC2, region, attributes["instanceType"]
+    elif service_code == "ElasticMapReduce":
+        if attributes.get("instanceType") and attributes.get("softwareType") == "EMR":
+            return EMR, region, attributes["instanceType"]
+    return None
+
+def iter_offer_prices(offer: Dict) -> Iterator[Tuple[str, str, str, float]]:
+    """Yields (service, region, key, price) for every tracked product in a bulk offer document."""
+    on_demand = offer.get("terms", {}).get("OnDemand", {})
+    for sku, product in offer.get("products", {}).items():
+        key = _product_key(product)
+        if key is None:
+            continue
+        price = _hourly_usd_price(on_demand.get(sku, {}))
+        if price is not None:
+            yield key + (price,)
+
+def load_offer(source: str) -> Dict:
+    """Loads a bulk offer document from a local path or an http(s) URL."""
+    if source.startswith(("http://", "https://")):
+        import requests
+        response = requests.get(source, timeout=(5, 300))
+        response.raise_for_status()
+        return response.json()
+    with open(source, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def write_catalog(prices: Iterable[Tuple[str, str, str, float]], path: str,
+                  built_at: Optional[float] = None) -> int:
+    """
+    Compiles (service, region, key, price) tuples into a catalog file at path.
+
+    The file is written next to its destination and renamed into place, so
+    readers never see a partially written catalog. Returns the entry count.
+    """
+    entries = {}
+    for service, region, key, price in prices:
+        entries[_catalog_key(service, region, key)] = price
+
+    n_slots = 8
+    while n_slots < 2 * len(entries):
+        n_slots *= 2
+    mask = n_slots - 1
+    keys_offset = _HEADER.size + n_slots * _SLOT.size
+
+    slots = [None] * n_slots
+    key_blob = bytearray()
+    for key, price in entries.items():
+        key_hash = _hash_key(key)
+        index = key_hash & mask
+        while slots[index] is not None:
+            index = (index + 1) & mask
+        slots[index] = (key_hash, keys_offset + len(key_blob), len(key), price)
+        key_blob += key
+
+    buffer = bytearray(keys_offset)
+    _HEADER.pack_into(buffer, 0, _MAGIC, _VERSION, 0, time.time() if built_at is None else built_at,
+                      n_slots, len(entries))
+    for index, slot in enumerate(slots):
+        if slot is not None:
+            _SLOT.pack_into(buffer, _HEADER.size + index * _SLOT.size, *slot)
+    buffer += key_blob
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    with open(tmp_path, "wb") as f:
+        f.write(buffer)
+    os.replace(tmp_path, path)
+    logger.info("Wrote pricing catalog %s with %d entries", path, len(entries))
+    return len(entries)
+
+def compile_catalog(sources: Iterable[str], path: str) -> int:
+    """Ingests bulk offer files (paths or URLs) and writes the compiled catalog to path."""
+    def prices():
+        for source in sources:
+            logger.info("Ingesting AWS price list %s", source)
+            yield from iter_offer_prices(load_offer(source))
+    return write_catalog(prices(), path)
+
+class PricingCatalog:
+    """Read-only, memory-mapped view of a compiled pricing catalog."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            try:
+                self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError as e:
+                raise CatalogError(f"Empty pricing catalog: {path}") from e
+        if len(self._mm) < _HEADER.size:
+            raise CatalogError(f"Truncated pricing catalog: {path}")
+        magic, version, _, built_at, n_slots, n_entries = _HEADER.unpack_from(self._mm, 0)
+        if magic != _MAGIC or version != _VERSION:
+            raise CatalogError(f"Unsupported pricing catalog format: {path}")
+        if len(self._mm) < _HEADER.size + n_slots * _SLOT.size:
+            raise CatalogError(f"Truncated pricing catalog: {path}")
+        self.built_at = built_at
+        self._n_slots = n_slots
+        self._mask = n_slots - 1
+        self._n_entries = n_entries
+
+    def __len__(self) -> int:
+        return self._n_entries
+
+    def lookup(self, service: str, region: str, key: str) -> Optional[float]:
+        """Returns the hourly USD price for (service, region, key), or None if absent."""
+        catalog_key = _catalog_key(service, region, key)
+        key_hash = _hash_key(catalog_key)
+        index = key_hash & self._mask
+        mm = self._mm
+        while True:
+            slot_hash, key_offset, key_length, price = _SLOT.unpack_from(mm, _HEADER.size + index * _SLOT.size)
+            if key_length == 0:
+                return None
+            if slot_hash == key_hash and mm[key_offset:key_offset + key_length] == catalog_key:
+                return price
+            index = (index + 1) & self._mask
+
+    def age(self) -> float:
+        """Seconds since the catalog was compiled."""
+        return time.time() - self.built_at
+
+    def is_stale(self, ttl: float) -> bool:
+        return self.age() > ttl
+
+    def close(self) -> None:
+        self._mm.close()
+
+def catalog_path() -> str:
+    """Returns the configured catalog path (DD_MLOPS_PRICING_CATALOG or the user cache)."""
+    return os.environ.get(CATALOG_ENV_VAR, DEFAULT_CATALOG_PATH)
+
+def catalog_ttl() -> float:
+    """Returns the catalog TTL in seconds (DD_MLOPS_PRICING_TTL, default 7 days)."""
+    return float(os.environ.get(TTL_ENV_VAR, DEFAULT_TTL_SECONDS))
+
+@functools.lru_cache(maxsize=1)
+def get_catalog() -> Optional[PricingCatalog]:
+    """
+    Opens the configured catalog once per process.
+
+    Returns None when no catalog has been built, so callers fall back to the
+    static price tables. A stale catalog is still used, with a warning; refresh
+    it out of band with refresh_catalog() or the module CLI.
+    """
+    path = catalog_path()
+    if not os.path.exists(path):
+        return None
+    try:
+        catalog = PricingCatalog(path)
+    except (OSError, CatalogError) as e:
+        logger.warning("Unable to open pricing catalog %s: %s", path, e)
+        return None
+    if catalog.is_stale(catalog_ttl()):
+        logger.warning("Pricing catalog %s is %.1f days old; consider refreshing it", path, catalog.age() / 86400)
+    return catalog
+
+def refresh_catalog(sources: Iterable[str], path: Optional[str] = None,
+                    ttl: Optional[float] = None, force: bool = False) -> bool:
+    """
+    Rebuilds the catalog from sources if it is missing or older than ttl.
+
+    Returns True if the catalog was rebuilt.
+    """
+    path = path or catalog_path()
+    ttl = catalog_ttl() if ttl is None else ttl
+    if not force and os.path.exists(path):
+        try:
+            catalog = PricingCatalog(path)
+            stale = catalog.is_stale(ttl)
+            catalog.close()
+            if not stale:
+                logger.info("Pricing catalog %s is fresh; skipping refresh", path)
+                return False
+        except CatalogError as e:
+            logger.warning("Rebuilding unreadable pricing catalog %s: %s", path, e)
+    compile_catalog(sources, path)
+    get_catalog.cache_clear()
+    return True
+
+def main(argv=None) -> int:
+    import argparse
+    parser = argparse.ArgumentParser(description="Compile AWS bulk price lists into a dd_mlops_costs pricing catalog.")
+    parser.add_argument("sources", nargs="*", help="Offer file paths or URLs")
+    parser.add_argument("-o", "--output", default=None, help="Catalog path (default: $%s or %s)" % (CATALOG_ENV_VAR, DEFAULT_CATALOG_PATH))
+    parser.add_argument("--service", action="append", default=[], help="Service code to download, e.g. AWSGlue, AmazonEC2, ElasticMapReduce")
+    parser.add_argument("--region", action="append", default=[], help="Region to download for each --service")
+    parser.add_argument("--ttl", type=float, default=None, help="Only rebuild if the catalog is older than this many seconds")
+    parser.add_argument("--force", action="store_true", help="Rebuild even if the catalog is fresh")
+    args = parser.parse_args(argv)
+
+    sources = list(args.sources)
+    for service_code in args.service:
+        for region in args.region:
+            sources.append(OFFER_URL.format(service_code=service_code, region=region))
+    if not sources:
+        parser.error("no price-list sources given")
+
+    logging.basicConfig(level=logging.INFO)
+    refresh_catalog(sources, args.output, args.ttl, args.force)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,156 @@
+import time
+import logging
+import threading
+from collections import deque
+from typing import Callable, Dict, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SAMPLE_INTERVAL = 5.0
+DEFAULT_SAMPLE_CAPACITY = 4096
+
+# A source returns the live worker count, optionally with how many of them are busy,
+# or None when the count is not available yet.
+WorkerSource = Callable[[], Union[None, int, Tuple[int, Optional[int]]]]
+
+_SAMPLER = None
+
+def spark_worker_source() -> Optional[Tuple[int, int]]:
+    """
+    Reads the live worker count from the active SparkContext.
+
+    Every Glue worker hosts one executor and the driver occupies a worker of its
+    own, so the executor list reported by the status tracker (which includes the
+    driver) is the billed worker count. Executors running at least one task are
+    counted as busy; the driver is always counted as busy.
+    """
+    from pyspark import SparkContext
+    sc = SparkContext._active_spark_context
+    if sc is None:
+        return None
+    infos = sc._jsc.sc().statusTracker().getExecutorInfos()
+    workers = len(infos)
+    busy = sum(1 for info in infos if info.numRunningTasks() > 0)
+    return workers, min(workers, busy + 1)
+
+class WorkerSampler:
+    """
+    Samples the live worker count on a background thread and integrates worker-seconds.
+
+    The worker count is assumed to hold from one sample to the next. Integrated
+    totals are kept in running accumulators, so they stay exact however long the
+    job runs; only the most recent `capacity` raw samples are kept, in a ring buffer.
+    """
+
+    def __init__(self, source: Optional[WorkerSource] = None,
+                 interval: float = DEFAULT_SAMPLE_INTERVAL,
+                 capacity: int = DEFAULT_SAMPLE_CAPACITY):
+        self.source = source or spark_worker_source
+        self.interval = interval
+        self.samples = deque(maxlen=capacity)
+        self.worker_seconds = 0.0
+        self.busy_seconds = 0.0
+        self.busy_known = True
+        self.elapsed = 0.0
+        self.peak_workers = 0
+        self._last = None
+        self._finished = False
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self) -> "WorkerSampler":
+        self.sample()
+        self._thread = threading.Thread(target=self._run, name="dd-mlops-costs-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def sample(self) -> None:
+        """Reads the source once and folds the previous interval into the totals."""
+        try:
+            value = self.source()
+        except Exception as e:
+            logger.debug("Worker sample failed: %s", e)
+            return
+        if value is None:
+            return
+        workers, busy = value if isinstance(value, tuple) else (value, None)
+        self._record(time.monotonic(), workers, busy)
+
+    def _record(self, now: float, workers: int, busy: Optional[int]) -> None:
+        with self._lock:
+            # A sample can arrive late or out of order if the sampling thread was still
+            # inside source() when stop() gave up waiting for it; never integrate it.
+            if self._finished or (self._last is not None and now < self._last[0]):
+                return
+            if self._last is not None:
+                last_time, last_workers, last_busy = self._last
+                dt = now - last_time
+                self.elapsed += dt
+                self.worker_seconds += last_workers * dt
+                if last_busy is None:
+                    self.busy_known = False
+                else:
+                    self.busy_seconds += min(last_busy, last_workers) * dt
+            self._last = (now, workers, busy)
+            self.samples.append(self._last)
+            self.peak_workers = max(self.peak_workers, workers)
+
+    def stop(self) -> Optional[Dict]:
+        """Stops sampling, closes the last interval and returns utilization()."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(self.interval)
+        stopped_at = time.monotonic()
+        self.sample()
+        with self._lock:
+            last = self._last
+        if last is not None and last[0] < stopped_at:
+            # The final read failed; carry the last known count up to now.
+            self._record(stopped_at, last[1], last[2])
+        with self._lock:
+            self._finished = True
+        return self.utilization()
+
+    def utilization(self) -> Optional[Dict]:
+        """
+        Returns the integrated worker usage, or None if fewer than two samples were taken:
+           - avg_workers: worker_seconds / sampled seconds
+           - peak_workers: highest sampled worker count
+           - idle_fraction: share of worker-seconds with no running task (None if unknown)
+        """
+        with self._lock:
+            if self.elapsed <= 0:
+                return None
+            idle_fraction = None
+            if self.busy_known and self.worker_seconds > 0:
+                idle_fraction = 1 - self.busy_seconds / self.worker_seconds
+            return {
+                "avg_workers": self.worker_seconds / self.elapsed,
+                "peak_workers": self.peak_workers,
+                "worker_seconds": self.worker_seconds,
+                "idle_fraction": idle_fraction,
+                "sampled_seconds": self.elapsed,
+            }
+
+def start_sampler(source: Optional[WorkerSource] = None,
+                  interval: float = DEFAULT_SAMPLE_INTERVAL) -> WorkerSampler:
+    """Starts the process-wide worker sampler, replacing any previous one."""
+    global _SAMPLER
+    if _SAMPLER is not None:
+        _SAMPLER.stop()
+    _SAMPLER = WorkerSampler(source, interval).start()
+    logger.info("Worker sampler started (interval %.1fs)", interval)
+    return _SAMPLER
+
+def stop_sampler() -> Optional[Dict]:
+    """Stops the process-wide sampler and returns its utilization, or None if none was running."""
+    global _SAMPLER
+    if _SAMPLER is None:
+        return None
+    sampler, _SAMPLER = _SAMPLER, None
+    return sampler.stop()
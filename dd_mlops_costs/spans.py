@@ -0,0 +1,92 @@
+import time
+import logging
+import threading
+import contextlib
+from typing import Dict, List
+from .glue_costs import calculate_glue_cost
+
+logger = logging.getLogger(__name__)
+
+# Aggregated span timings keyed by span path ("outer/inner"): [count, total nanoseconds].
+_SPAN_TOTALS: Dict[str, List[int]] = {}
+_SPAN_LOCK = threading.Lock()
+_LOCAL = threading.local()
+
+def _stack() -> list:
+    stack = getattr(_LOCAL, "stack", None)
+    if stack is None:
+        stack = _LOCAL.stack = []
+    return stack
+
+class cost_span(contextlib.ContextDecorator):
+    """
+    Times a stage of the job so its share of the job cost can be reported.
+
+    Usable as a context manager or decorator:
+        with cost_span("feature_join"):
+            ...
+
+        @cost_span("train")
+        def train(): ...
+
+    Spans nest per thread; a span opened inside another is recorded under the path
+    "outer/inner". Repeated spans with the same path are aggregated into a count and
+    a total duration, so spans can be used inside hot loops without growing memory.
+    Timing uses the monotonic perf_counter_ns clock.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        stack = _stack()
+        path = f"{stack[-1][0]}/{self.name}" if stack else self.name
+        stack.append((path, time.perf_counter_ns()))
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter_ns()
+        path, start = _stack().pop()
+        with _SPAN_LOCK:
+            totals = _SPAN_TOTALS.get(path)
+            if totals is None:
+                _SPAN_TOTALS[path] = [1, end - start]
+            else:
+                totals[0] += 1
+                totals[1] += end - start
+        return False
+
+def get_span_timings() -> Dict[str, Dict]:
+    """Returns {path: {"count": n, "duration_seconds": total}} for every recorded span."""
+    with _SPAN_LOCK:
+        return {
+            path: {"count": count, "duration_seconds": total_ns / 1e9}
+            for path, (count, total_ns) in _SPAN_TOTALS.items()
+        }
+
+def get_span_costs(resource_data: Dict) -> List[Dict]:
+    """
+    Prices every recorded span with calculate_glue_cost and clears them.
+
+    A span's cost is its share of the job's DPU cost: the configured workers for the
+    span's total duration. Parent spans include the time of their children. Spans are
+    taken and cleared atomically, so each job reports its spans exactly once and the
+    next job in the same process starts empty.
+    """
+    with _SPAN_LOCK:
+        totals = dict(_SPAN_TOTALS)
+        _SPAN_TOTALS.clear()
+    return [
+        {
+            "span": path,
+            "count": count,
+            "duration_seconds": total_ns / 1e9,
+            "cost": calculate_glue_cost(resource_data, total_ns / 1e9),
+        }
+        for path, (count, total_ns) in sorted(totals.items())
+    ]
+
+def reset_spans() -> None:
+    """Discards all recorded spans."""
+    with _SPAN_LOCK:
+        _SPAN_TOTALS.clear()
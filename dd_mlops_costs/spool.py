@@ -0,0 +1,338 @@
+"""
+Durable write-ahead spool for metric submissions that could not be delivered.
+
+Each undelivered report is written as one JSON line, {"run_id": ..., "series": [...]}.
+Series keep their original timestamps, so a later replay fills the gap exactly where
+it happened.
+
+The spool location is set with the DD_MLOPS_SPOOL_PATH job argument or environment
+variable:
+  - A local path: records are appended to a size-capped file. When it reaches its cap
+    it is rotated to <path>.1, replacing the previous rotation, which bounds disk use
+    at twice the cap. Writers and replay hold an flock on <path>.lock, so several
+    processes can share one spool. Only durable if the disk outlives the job (not
+    true on Glue).
+  - An s3://bucket/prefix URL: every write is a new object under the prefix, so
+    spooled metrics survive the job's container and can be replayed from anywhere.
+    Expire old objects with an S3 lifecycle rule.
+When it is unset, records go to the user cache with a warning, since that disk is
+discarded with a Glue worker.
+
+Replay the spool (for example from a scheduled job) with:
+    DD_MLOPS_SPOOL_PATH=s3://bucket/prefix DATADOG_API_KEY=... python -m dd_mlops_costs.spool
+"""
+import os
+import sys
+import glob
+import json
+import time
+import uuid
+import socket
+import hashlib
+import logging
+import threading
+import contextlib
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SPOOL_ENV_VAR = "DD_MLOPS_SPOOL_PATH"
+DEFAULT_SPOOL_PATH = os.path.join(os.path.expanduser("~"), ".cache", "dd_mlops_costs", "spool.jsonl")
+DEFAULT_MAX_SPOOL_BYTES = 64 * 1024 * 1024
+
+# --- Replay ---
+DEFAULT_REPLAY_BATCH = 10000
+DEFAULT_REPLAY_ATTEMPTS = 3
+DEFAULT_REPLAY_BUDGET = 120.0
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows; only threads are serialized there
+    fcntl = None
+
+_SPOOL_LOCK = threading.Lock()
+
+SpoolRecord = Tuple[Optional[str], List[Dict]]
+
+_WARNED_DEFAULT_PATH = False
+
+def spool_path() -> str:
+    """
+    Returns the spool location: the --DD_MLOPS_SPOOL_PATH job argument or the
+    DD_MLOPS_SPOOL_PATH environment variable, else the user cache with a one-time
+    warning.
+    """
+    from .job_context import parse_job_arguments
+    global _WARNED_DEFAULT_PATH
+    path = parse_job_arguments().get(SPOOL_ENV_VAR) or os.environ.get(SPOOL_ENV_VAR)
+    if path:
+        return path
+    if not _WARNED_DEFAULT_PATH:
+        _WARNED_DEFAULT_PATH = True
+        logger.warning("%s is not set; spooling undelivered metrics to %s, which is lost when a Glue or EMR "
+                       "node is discarded. Set it to an s3:// prefix to keep them.", SPOOL_ENV_VAR, DEFAULT_SPOOL_PATH)
+    return DEFAULT_SPOOL_PATH
+
+def _is_s3(path: str) -> bool:
+    return path.startswith("s3://")
+
+def _split_s3(path: str) -> Tuple[str, str]:
+    """Splits s3://bucket/prefix into (bucket, "prefix/"); the prefix may be empty."""
+    bucket, _, prefix = path[len("s3://"):].partition("/")
+    prefix = prefix.strip("/")
+    return bucket, f"{prefix}/" if prefix else ""
+
+def _s3_client():
+    import boto3
+    return boto3.client("s3")
+
+@contextlib.contextmanager
+def _locked(path: str) -> Iterator[None]:
+    """
+    Serializes access to a local spool across threads and processes with an flock on
+    <path>.lock. The lock file is never removed, so every process locks the same inode.
+    """
+    with _SPOOL_LOCK:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        if fcntl is None:
+            yield
+            return
+        with open(f"{path}.lock", "a") as lock:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
+
+def _encode_records(records: Iterable[SpoolRecord]) -> bytes:
+    return "".join(
+        json.dumps({"run_id": run_id, "series": series}, separators=(",", ":")) + "\n"
+        for run_id, series in records
+    ).encode("utf-8")
+
+def write_spool(records: List[SpoolRecord], path: Optional[str] = None,
+                max_bytes: int = DEFAULT_MAX_SPOOL_BYTES, s3=None) -> int:
+    """
+    Writes (run_id, series) records to the spool: appended and fsynced to a local
+    file, or as one new object under an s3:// prefix.
+
+    Returns the number of series written. Errors are logged, not raised, so a
+    full or read-only disk or an unreachable bucket never fails the job.
+    """
+    path = path or spool_path()
+    data = _encode_records(records)
+    if not data:
+        return 0
+    if _is_s3(path):
+        bucket, prefix = _split_s3(path)
+        key = f"{prefix}{int(time.time() * 1000)}-{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}.jsonl"
+        try:
+            (s3 or _s3_client()).put_object(Bucket=bucket, Key=key, Body=data)
+        except Exception as e:
+            logger.error("Unable to spool undelivered metrics to s3://%s/%s: %s", bucket, key, e)
+            return 0
+        count = sum(len(series) for _, series in records)
+        logger.warning("Spooled %d undelivered series to s3://%s/%s", count, bucket, key)
+        return count
+    try:
+        with _locked(path):
+            size = os.path.getsize(path) if os.path.exists(path) else 0
+            if size and size + len(data) > max_bytes:
+                logger.warning("Spool %s reached %d bytes; rotating and discarding the oldest spooled metrics", path, size)
+                os.replace(path, f"{path}.1")
+            with open(path, "ab") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+    except OSError as e:
+        logger.error("Unable to spool undelivered metrics to %s: %s", path, e)
+        return 0
+    count = sum(len(series) for _, series in records)
+    logger.warning("Spooled %d undelivered series to %s", count, path)
+    return count
+
+def _parse_lines(lines: Iterable[bytes], source: str) -> Iterator[SpoolRecord]:
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+            yield record.get("run_id"), record["series"]
+        except (ValueError, KeyError, TypeError, AttributeError):
+            logger.warning("Skipping malformed spool line in %s", source)
+
+def iter_spool_file(path: str) -> Iterator[SpoolRecord]:
+    """Streams records from one spool file, skipping lines torn by a crash mid-write."""
+    with open(path, "rb") as f:
+        yield from _parse_lines(f, path)
+
+def iter_spool_object(s3, bucket: str, key: str) -> Iterator[SpoolRecord]:
+    """Streams records from one spool object in S3."""
+    body = s3.get_object(Bucket=bucket, Key=key)["Body"]
+    try:
+        yield from _parse_lines(body.iter_lines(), f"s3://{bucket}/{key}")
+    finally:
+        body.close()
+
+def _record_key(run_id: Optional[str], series: List[Dict]) -> str:
+    """
+    Identifies a spooled report: its run id plus the metric names and tags it carries,
+    since one run submits several reports (job totals, spans). Records without a run
+    id are identified by their full content.
+    """
+    if run_id:
+        identity = json.dumps([[entry["metric"], entry["tags"]] for entry in series])
+        return f"{run_id}|{hashlib.sha1(identity.encode('utf-8')).hexdigest()}"
+    return hashlib.sha1(json.dumps(series, sort_keys=True).encode("utf-8")).hexdigest()
+
+def _claim_spool(path: str) -> List[str]:
+    """
+    Moves the spool files aside so new failures go to a fresh spool during replay.
+    Each move holds the spool lock, so no writer, in this or another process, is
+    appending to a file while it is renamed.
+
+    Files claimed by an interrupted earlier replay are picked up again.
+    """
+    claimed = sorted(glob.glob(f"{glob.escape(path)}.replay.*"))
+    for index, source in enumerate((f"{path}.1", path)):
+        with _locked(path):
+            if os.path.exists(source):
+                target = f"{path}.replay.{os.getpid()}.{int(time.time())}.{index}"
+                os.replace(source, target)
+                claimed.append(target)
+    return claimed
+
+def _send_with_retries(series: List[Dict], dd_api_key: str, attempts: int, deadline: float) -> str:
+    """
+    Posts series with at most `attempts` tries, never waiting past deadline.
+
+    Returns the last post_series_status; a rejected batch is not retried.
+    """
+    from .datadog_client import post_series_status, RETRY
+    delay = 0.5
+    for attempt in range(attempts):
+        status = post_series_status(series, dd_api_key)
+        if status != RETRY:
+            return status
+        remaining = deadline - time.monotonic()
+        if attempt == attempts - 1 or remaining <= 0:
+            break
+        time.sleep(min(delay, remaining))
+        delay *= 2
+    return RETRY
+
+def _list_s3_spool(s3, bucket: str, prefix: str) -> List[str]:
+    """Lists the spool object keys under prefix, oldest first."""
+    keys = []
+    for page in s3.get_paginator("list_objects_v2").paginate(Bucket=bucket, Prefix=prefix):
+        keys.extend(item["Key"] for item in page.get("Contents", []) if item["Key"].endswith(".jsonl"))
+    return sorted(keys)
+
+def replay_spool(dd_api_key: str, path: Optional[str] = None,
+                 batch_series: int = DEFAULT_REPLAY_BATCH,
+                 max_attempts: int = DEFAULT_REPLAY_ATTEMPTS,
+                 time_budget: float = DEFAULT_REPLAY_BUDGET,
+                 s3=None) -> int:
+    """
+    Streams the spool to Datadog in large batches with the original timestamps.
+
+    Records are deduplicated by run id (see _record_key), so a report spooled twice is
+    only sent once. Batches that still fail after max_attempts, or once
+    time_budget is spent, are written back to the spool for the next replay.
+    A batch Datadog rejects outright (a 4xx, see post_series_status) is split in
+    halves and resent until the offending records are isolated; those are dropped
+    with an error, and only the rest of the batch is delivered or kept.
+    For an s3:// spool, the objects listed at the start are read and deleted once
+    their records were delivered or written back; objects spooled meanwhile are
+    left for the next replay.
+
+    Returns the number of series delivered.
+    """
+    from .datadog_client import DELIVERED, REJECTED
+    path = path or spool_path()
+    if _is_s3(path):
+        s3 = s3 or _s3_client()
+        bucket, prefix = _split_s3(path)
+        keys = _list_s3_spool(s3, bucket, prefix)
+        sources = [iter_spool_object(s3, bucket, key) for key in keys]
+
+        def release() -> None:
+            for key in keys:
+                s3.delete_object(Bucket=bucket, Key=key)
+    else:
+        claimed = _claim_spool(path)
+        sources = [iter_spool_file(claimed_path) for claimed_path in claimed]
+
+        def release() -> None:
+            for claimed_path in claimed:
+                os.remove(claimed_path)
+    deadline = time.monotonic() + time_budget
+    seen = set()
+    batch: List[SpoolRecord] = []
+    batch_size = 0
+    delivered = 0
+    failed: List[SpoolRecord] = []
+
+    def send(records: List[SpoolRecord]) -> None:
+        nonlocal delivered
+        series = [entry for _, record_series in records for entry in record_series]
+        status = _send_with_retries(series, dd_api_key, max_attempts, deadline) \
+            if time.monotonic() < deadline else None
+        if status == DELIVERED:
+            delivered += len(series)
+        elif status == REJECTED and len(records) > 1:
+            middle = len(records) // 2
+            send(records[:middle])
+            send(records[middle:])
+        elif status == REJECTED:
+            logger.error("Datadog rejected spooled record for run %s; dropping it: %s",
+                         records[0][0], json.dumps(series)[:500])
+        else:
+            failed.extend(records)
+
+    def flush() -> None:
+        nonlocal batch, batch_size
+        send(batch)
+        batch, batch_size = [], 0
+
+    for source in sources:
+        for run_id, series in source:
+            key = _record_key(run_id, series)
+            if key in seen:
+                continue
+            seen.add(key)
+            batch.append((run_id, series))
+            batch_size += len(series)
+            if batch_size >= batch_series:
+                flush()
+    if batch:
+        flush()
+
+    if failed and not write_spool(failed, path, s3=s3):
+        # Keep the originals rather than lose the undelivered records; delivered ones
+        # will be sent again next time, which is harmless for gauges.
+        logger.error("Could not write %d undelivered records back to the spool; keeping the replayed spool", len(failed))
+    else:
+        release()
+    logger.info("Replayed %d spooled series; %d records left in the spool", delivered, len(failed))
+    return delivered
+
+def main(argv=None) -> int:
+    import argparse
+    parser = argparse.ArgumentParser(description="Replay metrics spooled by dd_mlops_costs to Datadog.")
+    parser.add_argument("--path", default=None,
+                        help="Spool path or s3://bucket/prefix (default: $%s or %s)" % (SPOOL_ENV_VAR, DEFAULT_SPOOL_PATH))
+    parser.add_argument("--batch-series", type=int, default=DEFAULT_REPLAY_BATCH)
+    parser.add_argument("--attempts", type=int, default=DEFAULT_REPLAY_ATTEMPTS)
+    parser.add_argument("--time-budget", type=float, default=DEFAULT_REPLAY_BUDGET)
+    args = parser.parse_args(argv)
+
+    dd_api_key = os.environ.get("DATADOG_API_KEY")
+    if not dd_api_key:
+        parser.error("DATADOG_API_KEY must be set")
+    logging.basicConfig(level=logging.INFO)
+    replay_spool(dd_api_key, args.path, args.batch_series, args.attempts, args.time_budget)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
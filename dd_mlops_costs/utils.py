@@ -1,30 +1,91 @@
 import os
+import time
 import logging
-import boto3
+import functools
 from datetime import datetime
+from typing import Optional
+from .sampler import start_sampler, WorkerSource, DEFAULT_SAMPLE_INTERVAL
 
 logger = logging.getLogger(__name__)
 
 _JOB_START_TIME = None
+_JOB_START_MONOTONIC = None
 
-def start_timer() -> None:
-    """Starts the job timer; call at the beginning of your job."""
-    global _JOB_START_TIME
+def start_timer(
+    sample_workers: bool = False,
+    worker_source: Optional[WorkerSource] = None,
+    sample_interval: float = DEFAULT_SAMPLE_INTERVAL
+) -> None:
+    """
+    Starts the job timer; call at the beginning of your job.
+
+    With sample_workers=True, a background sampler also tracks the live worker count
+    (from Spark, or worker_source if given) so auto-scaled jobs are billed for the
+    workers they actually used. Spans recorded with cost_span before this call are
+    discarded, so they are not billed to this job.
+    """
+    from .spans import reset_spans  # imported here: spans -> glue_costs -> job_context -> utils
+    global _JOB_START_TIME, _JOB_START_MONOTONIC
+    reset_spans()
     _JOB_START_TIME = datetime.utcnow()
+    _JOB_START_MONOTONIC = time.monotonic()
     logger.info("Job timer started at %s", _JOB_START_TIME)
+    if sample_workers:
+        start_sampler(worker_source, sample_interval)
 
 def get_elapsed_time() -> float:
-    """Returns elapsed time in seconds since start_timer() was called."""
-    if _JOB_START_TIME is None:
+    """Returns elapsed time in seconds since start_timer() was called, using a monotonic clock."""
+    if _JOB_START_MONOTONIC is None:
         raise RuntimeError("Timer not started. Please call start_timer() first.")
-    delta = datetime.utcnow() - _JOB_START_TIME
-    return delta.total_seconds()
+    return time.monotonic() - _JOB_START_MONOTONIC
+
+IMDS_URL = "http://169.254.169.254/latest"
+IMDS_TIMEOUT = 0.2
+
+def get_instance_region() -> Optional[str]:
+    """Reads the region from the EC2 instance metadata service (IMDSv2), or None if unreachable."""
+    if os.environ.get("AWS_EC2_METADATA_DISABLED", "").lower() == "true":
+        return None
+    from urllib.request import Request, urlopen
+    try:
+        token_request = Request(f"{IMDS_URL}/api/token", method="PUT",
+                                headers={"X-aws-ec2-metadata-token-ttl-seconds": "60"})
+        token = urlopen(token_request, timeout=IMDS_TIMEOUT).read().decode()
+        region_request = Request(f"{IMDS_URL}/meta-data/placement/region",
+                                 headers={"X-aws-ec2-metadata-token": token})
+        return urlopen(region_request, timeout=IMDS_TIMEOUT).read().decode().strip() or None
+    except Exception as e:
+        logger.debug("Instance metadata unavailable: %s", e)
+        return None
 
+@functools.lru_cache(maxsize=1)
 def get_region() -> str:
-    """Detects the AWS region using the boto3 session or AWS_REGION environment variable."""
-    session = boto3.Session()
-    region = session.region_name or os.environ.get("AWS_REGION")
+    """
+    Detects the AWS region from AWS_REGION / AWS_DEFAULT_REGION, then instance metadata,
+    then the boto3 session configuration. boto3 is only imported if the cheaper sources miss.
+    """
+    region = os.environ.get("AWS_REGION") or os.environ.get("AWS_DEFAULT_REGION") or get_instance_region()
+    if not region:
+        import boto3
+        region = boto3.Session().region_name
     if not region:
         raise RuntimeError("Unable to determine AWS region")
     logger.info("Detected AWS region: %s", region)
-    return region
\ No newline at end of file
+    return region
+
+def detect_environment() -> str:
+    """
+    Detects whether the code is running in AWS Glue or EMR.
+    Returns "glue" or "emr".
+
+    EMR is recognized by its job-flow.json; JOB_ENVIRONMENT overrides detection, and
+    anything else is assumed to be Glue.
+    """
+    env = os.environ.get("JOB_ENVIRONMENT")
+    if env:
+        logger.info("Environment detected via JOB_ENVIRONMENT: %s", env.lower())
+        return env.lower()
+    if os.path.exists('/mnt/var/lib/info/job-flow.json'):
+        logger.info("Environment detected: EMR")
+        return "emr"
+    return "glue"
@@ -10,7 +10,7 @@ setup(
     install_requires=[
         "boto3",
         "datadog",
-        "jmespath"
+        "requests"
     ],
     classifiers=[
         "Programming Language :: Python :: 3",
@@ -0,0 +1,53 @@
+import sys
+
+import pytest
+
+from dd_mlops_costs import cost_tracker, job_context, utils
+from dd_mlops_costs.pricing_catalog import get_catalog
+
+
+class RecordingSubmitter:
+    """Stands in for MetricSubmitter / CollectorClient and records every submit()."""
+
+    def __init__(self, *args, **kwargs):
+        self.submits = []
+
+    def submit(self, metrics, tags, timestamp=None, run_id=None):
+        self.submits.append({"metrics": metrics, "tags": tags, "timestamp": timestamp, "run_id": run_id})
+
+    def close(self, timeout=None):
+        return True
+
+
+@pytest.fixture
+def glue_env(monkeypatch, tmp_path):
+    """A Glue job configured entirely from environment variables, with no AWS or Datadog access."""
+    for name, value in {
+        "AWS_REGION": "us-east-1",
+        "AWS_EC2_METADATA_DISABLED": "true",
+        "DATADOG_API_KEY": "test",
+        "JOB_NAME": "test-job",
+        "JOB_RUN_ID": "jr_test",
+        "GLUE_WORKER_TYPE": "G.1X",
+        "GLUE_NUMBER_OF_WORKERS": "10",
+        "DD_MLOPS_CACHE_DIR": str(tmp_path / "cache"),
+        "DD_MLOPS_SPOOL_PATH": str(tmp_path / "spool.jsonl"),
+        "DD_MLOPS_PRICING_CATALOG": str(tmp_path / "missing.ddpc"),
+    }.items():
+        monkeypatch.setenv(name, value)
+    for name in ("JOB_ENVIRONMENT", "DD_MLOPS_COLLECTOR_ADDR", "JOB_VERSION"):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setattr(sys, "argv", ["job.py"])
+    for cached in (job_context.resolve_job_context, utils.get_region, get_catalog):
+        cached.cache_clear()
+    yield
+    for cached in (job_context.resolve_job_context, utils.get_region, get_catalog):
+        cached.cache_clear()
+
+
+@pytest.fixture
+def submitter(monkeypatch):
+    """Replaces the Datadog submitter used by report_job_cost with a RecordingSubmitter."""
+    recorder = RecordingSubmitter()
+    monkeypatch.setattr(cost_tracker, "get_submitter", lambda *args, **kwargs: recorder)
+    return recorder
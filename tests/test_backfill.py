@@ -0,0 +1,166 @@
+import datetime as dt
+import json
+import logging
+
+import boto3
+import pandas as pd
+import pytest
+from botocore.stub import Stubber
+
+from dd_mlops_costs import backfill
+from dd_mlops_costs.glue_costs import calculate_glue_costs
+
+pytestmark = pytest.mark.usefixtures("glue_env")
+
+T0 = dt.datetime(2024, 1, 1, tzinfo=dt.timezone.utc)
+
+
+def make_run(run_id, minute, state="SUCCEEDED", job_name="job-a", **extra):
+    run = {
+        "Id": run_id,
+        "JobName": job_name,
+        "JobRunState": state,
+        "StartedOn": T0 + dt.timedelta(minutes=minute),
+        "ExecutionTime": 60,
+    }
+    if state in backfill.TERMINAL_RUN_STATES:
+        run["CompletedOn"] = run["StartedOn"] + dt.timedelta(seconds=60)
+    run.update(extra)
+    return run
+
+
+@pytest.fixture
+def glue():
+    client = boto3.client("glue", region_name="us-east-1", aws_access_key_id="test", aws_secret_access_key="test")
+    with Stubber(client) as stubber:
+        client.stubber = stubber
+        yield client
+        stubber.assert_no_pending_responses()
+
+
+@pytest.fixture
+def posted(monkeypatch):
+    batches = []
+
+    def post_series(series, dd_api_key):
+        batches.append(series)
+        return True
+
+    monkeypatch.setattr(backfill, "post_series", post_series)
+    return batches
+
+
+def test_watermark_stops_at_running_run_and_rerun_picks_it_up(glue):
+    job = {"Name": "job-a", "WorkerType": "G.1X", "NumberOfWorkers": 2}
+    # get_job_runs lists newest first; run r2 is still running between two finished runs.
+    glue.stubber.add_response("get_job_runs", {"JobRuns": [
+        make_run("r3", 30), make_run("r2", 20, state="RUNNING"), make_run("r1", 10),
+    ]})
+    records, entry = backfill.collect_job_runs(glue, job, "us-east-1", {})
+    assert [record["run_id"] for record in records] == ["r3", "r1"]
+    assert entry == {"watermark": (T0 + dt.timedelta(minutes=10)).timestamp(), "run_ids": ["r3"]}
+
+    glue.stubber.add_response("get_job_runs", {"JobRuns": [
+        make_run("r3", 30), make_run("r2", 20), make_run("r1", 10),
+    ]})
+    records, entry = backfill.collect_job_runs(glue, job, "us-east-1", entry)
+    assert [record["run_id"] for record in records] == ["r2"]
+    assert entry == {"watermark": (T0 + dt.timedelta(minutes=30)).timestamp(), "run_ids": []}
+
+
+def test_pagination_stops_at_watermark(glue):
+    job = {"Name": "job-a", "WorkerType": "G.1X", "NumberOfWorkers": 2}
+    checkpoint = {"watermark": (T0 + dt.timedelta(minutes=20)).timestamp(), "run_ids": []}
+    glue.stubber.add_response("get_job_runs", {"JobRuns": [make_run("r4", 40), make_run("r2", 20)],
+                                               "NextToken": "more"})
+    records, entry = backfill.collect_job_runs(glue, job, "us-east-1", checkpoint)
+    assert [record["run_id"] for record in records] == ["r4"]
+    assert entry["watermark"] == (T0 + dt.timedelta(minutes=40)).timestamp()
+
+
+def test_maxcapacity_runs_are_priced_from_capacity_and_tagged_distinctly():
+    job = {"Name": "shell-job", "MaxCapacity": 0.0625}
+    record = backfill.run_to_record(make_run("r1", 0, job_name="shell-job", ExecutionTime=3600), job, "us-east-1")
+    assert record["worker_type"] == backfill.MAXCAPACITY_WORKER_TYPE
+    assert record["dpu_seconds"] == pytest.approx(0.0625 * 3600)
+    record["customer"] = "acme"
+
+    assert calculate_glue_costs(pd.DataFrame([record]))[0] == pytest.approx(0.0625 * 0.44)
+    series = backfill.records_to_series([record])
+    assert "glue_worker_type:maxcapacity" in series[0]["tags"]
+    assert not any(tag == "glue_worker_type:G.1X" for tag in series[0]["tags"])
+
+
+def test_dpu_seconds_take_precedence():
+    record = backfill.run_to_record(make_run("r1", 0, WorkerType="G.2X", NumberOfWorkers=10, DPUSeconds=720.0),
+                                    {"Name": "job-a"}, "us-east-1")
+    assert calculate_glue_costs(pd.DataFrame([record]))[0] == pytest.approx(720 / 3600 * 0.44)
+
+
+def test_run_backfill_skips_unpriceable_runs_and_counts_only_submitted(glue, posted, tmp_path, caplog):
+    glue.stubber.add_response("get_jobs", {"Jobs": [
+        {"Name": "job-a", "WorkerType": "G.1X", "NumberOfWorkers": 2},
+        {"Name": "job-z", "WorkerType": "Z.2X", "NumberOfWorkers": 2},
+    ]})
+    glue.stubber.add_response("get_job_runs", {"JobRuns": [make_run("ra", 0)]})
+    glue.stubber.add_response("get_job_runs", {"JobRuns": [make_run("rz", 0, job_name="job-z")]})
+    checkpoint_path = str(tmp_path / "checkpoint.json")
+
+    with caplog.at_level(logging.WARNING, logger=backfill.__name__):
+        submitted = backfill.run_backfill("key", ["us-east-1"], {"acct": None}, checkpoint_path,
+                                          max_workers=1, requests_per_second=1e6,
+                                          client_factory=lambda session, region: glue)
+    assert submitted == 1
+    (series,) = posted
+    assert [entry["metric"] for entry in series] == ["glue.job.cost", "glue.job.duration"]
+    assert "job-z/rz" in caplog.text
+
+    with open(checkpoint_path) as f:
+        checkpoint = json.load(f)
+    assert set(checkpoint) == {"acct/us-east-1/job-a", "acct/us-east-1/job-z"}
+
+
+def test_run_backfill_rerun_submits_only_new_runs(glue, posted, tmp_path):
+    checkpoint_path = str(tmp_path / "checkpoint.json")
+    job = {"Name": "job-a", "WorkerType": "G.1X", "NumberOfWorkers": 2,
+           "DefaultArguments": {"--customer": "acme"}}
+
+    def backfill_once():
+        return backfill.run_backfill("key", ["us-east-1"], {"acct": None}, checkpoint_path,
+                                     max_workers=1, requests_per_second=1e6,
+                                     client_factory=lambda session, region: glue)
+
+    glue.stubber.add_response("get_jobs", {"Jobs": [job]})
+    glue.stubber.add_response("get_job_runs", {"JobRuns": [make_run("r2", 20), make_run("r1", 10)]})
+    assert backfill_once() == 2
+    assert "customer:acme" in posted[0][0]["tags"]
+
+    glue.stubber.add_response("get_jobs", {"Jobs": [job]})
+    glue.stubber.add_response("get_job_runs", {"JobRuns": [make_run("r3", 30), make_run("r2", 20)]})
+    assert backfill_once() == 1
+    assert posted[1][0]["points"][0][0] == int((T0 + dt.timedelta(minutes=31)).timestamp())
+
+
+def test_failed_submission_does_not_advance_checkpoint(glue, monkeypatch, tmp_path):
+    monkeypatch.setattr(backfill, "post_series", lambda series, dd_api_key: False)
+    checkpoint_path = tmp_path / "checkpoint.json"
+    glue.stubber.add_response("get_jobs", {"Jobs": [{"Name": "job-a", "WorkerType": "G.1X"}]})
+    glue.stubber.add_response("get_job_runs", {"JobRuns": [make_run("r1", 10)]})
+    with pytest.raises(RuntimeError):
+        backfill.run_backfill("key", ["us-east-1"], {"acct": None}, str(checkpoint_path),
+                              max_workers=1, requests_per_second=1e6,
+                              client_factory=lambda session, region: glue)
+    assert not checkpoint_path.exists()
+
+
+def test_flex_runs_are_priced_at_the_flex_rate_and_tagged():
+    job = {"Name": "job-a", "WorkerType": "G.1X", "NumberOfWorkers": 10}
+    flex = backfill.run_to_record(make_run("r1", 0, ExecutionTime=3600, ExecutionClass="FLEX"), job, "us-east-1")
+    standard = backfill.run_to_record(make_run("r2", 0, ExecutionTime=3600), job, "us-east-1")
+    assert (flex["execution_class"], standard["execution_class"]) == ("FLEX", "STANDARD")
+    records = [dict(flex, customer="acme"), dict(standard, customer="acme")]
+
+    assert calculate_glue_costs(pd.DataFrame(records)).tolist() == pytest.approx([10 * 0.29, 10 * 0.44])
+    series = backfill.records_to_series(records)
+    assert "glue_execution_class:flex" in series[0]["tags"]
+    assert "glue_execution_class:standard" in series[2]["tags"]
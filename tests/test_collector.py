@@ -0,0 +1,164 @@
+import json
+import math
+import socket
+import threading
+import time
+
+import pytest
+
+from dd_mlops_costs import collector
+from dd_mlops_costs.collector import Aggregator, LogSketch, parse_event, OVERFLOW_TAGS
+
+
+def test_sketch_quantiles_within_relative_accuracy():
+    sketch = LogSketch(relative_accuracy=0.01)
+    values = list(range(1, 1001))
+    for value in values:
+        sketch.add(value)
+    assert sketch.count == 1000
+    assert sketch.sum == sum(values)
+    assert sketch.max == 1000
+    for q in (0.5, 0.95, 0.99):
+        expected = values[int(q * (len(values) - 1))]
+        assert abs(sketch.quantile(q) - expected) <= 0.01 * expected + 1
+
+
+def test_sketch_counts_non_positive_values_as_zero():
+    sketch = LogSketch()
+    for value in (0, -5, 10):
+        sketch.add(value)
+    assert sketch.zero_count == 2
+    assert sketch.quantile(0.0) == 0.0
+    assert sketch.quantile(1.0) == pytest.approx(10, rel=0.01)
+
+
+@pytest.mark.parametrize("value", [math.nan, math.inf, -math.inf])
+def test_sketch_rejects_non_finite_values_without_side_effects(value):
+    sketch = LogSketch()
+    sketch.add(2.0)
+    with pytest.raises(ValueError):
+        sketch.add(value)
+    assert (sketch.count, sketch.sum, sketch.max) == (1, 2.0, 2.0)
+
+
+def test_sketch_merge():
+    a, b = LogSketch(), LogSketch()
+    for value in (1, 2, 3):
+        a.add(value)
+    for value in (0, 100):
+        b.add(value)
+    a.merge(b)
+    assert (a.count, a.sum, a.max, a.zero_count) == (5, 106, 100, 1)
+    with pytest.raises(ValueError):
+        a.merge(LogSketch(relative_accuracy=0.05))
+
+
+def test_empty_sketch_quantile_is_none():
+    assert LogSketch().quantile(0.5) is None
+
+
+def test_aggregator_rolls_up_per_tag_set():
+    aggregator = Aggregator()
+    aggregator.add(["b:2", "a:1"], {"glue.job.cost": 1.0})
+    aggregator.add(["a:1", "b:2"], {"glue.job.cost": 3.0})
+    aggregator.add(["a:2"], {"glue.job.cost": 5.0})
+    rollups = dict((tuple(tags), {m["metric"]: m["value"] for m in metrics})
+                   for tags, metrics in aggregator.rollup())
+    assert rollups[("a:1", "b:2")]["glue.job.cost.count"] == 2
+    assert rollups[("a:1", "b:2")]["glue.job.cost.sum"] == 4.0
+    assert rollups[("a:1", "b:2")]["glue.job.cost.avg"] == 2.0
+    assert rollups[("a:1", "b:2")]["glue.job.cost.max"] == 3.0
+    assert set(rollups[("a:2",)]) >= {"glue.job.cost.p50", "glue.job.cost.p95", "glue.job.cost.p99"}
+
+
+def test_aggregator_folds_extra_tag_sets_into_overflow():
+    aggregator = Aggregator(max_tag_sets=2)
+    for i in range(5):
+        aggregator.add([f"job:{i}"], {"x": 1.0})
+    assert len(aggregator.sketches) == 3
+    assert aggregator.sketches[OVERFLOW_TAGS]["x"].count == 3
+
+
+def test_aggregator_rejects_non_finite_event_atomically():
+    aggregator = Aggregator()
+    with pytest.raises(ValueError):
+        aggregator.add(["a:1"], {"good": 1.0, "bad": math.nan})
+    assert aggregator.sketches == {}
+    assert aggregator.events == 0
+
+
+def test_rollup_is_valid_json():
+    aggregator = Aggregator()
+    aggregator.add([], {"x": 1.5})
+    for _, metrics in aggregator.rollup():
+        json.loads(json.dumps(metrics, allow_nan=False))
+
+
+def test_parse_event():
+    tags, values = parse_event(b'{"tags": ["a:1"], "values": {"x": 1, "y": 2.5}}')
+    assert tags == ["a:1"]
+    assert values == {"x": 1.0, "y": 2.5}
+    assert parse_event(b'{"values": {"x": 1}}')[0] == []
+
+
+@pytest.mark.parametrize("datagram", [
+    b"not json",
+    b"\xff\xfe",
+    b"[]",
+    b'{"tags": ["a"]}',
+    b'{"values": [1]}',
+    b'{"values": {}}',
+    b'{"values": {"x": "1"}}',
+    b'{"values": {"x": true}}',
+    b'{"values": {"x": null}}',
+    b'{"values": {"x": Infinity}}',
+    b'{"values": {"x": NaN}}',
+    b'{"tags": "a:1", "values": {"x": 1}}',
+    b'{"tags": [1], "values": {"x": 1}}',
+])
+def test_parse_event_rejects_malformed_datagrams(datagram):
+    with pytest.raises(ValueError):
+        parse_event(datagram)
+
+
+class RecordingSubmitter:
+    def __init__(self, dd_api_key):
+        self.batches = []
+
+    def submit(self, metrics, tags, timestamp=None, run_id=None):
+        self.batches.append((tags, metrics))
+
+    def close(self, timeout=None):
+        pass
+
+
+def test_serve_survives_malformed_datagrams(monkeypatch):
+    submitters = []
+
+    def make_submitter(dd_api_key):
+        submitters.append(RecordingSubmitter(dd_api_key))
+        return submitters[-1]
+
+    monkeypatch.setattr(collector, "MetricSubmitter", make_submitter)
+    probe = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    probe.bind(("127.0.0.1", 0))
+    port = probe.getsockname()[1]
+    probe.close()
+
+    server = threading.Thread(target=collector.serve, args=("key", "127.0.0.1", port),
+                              kwargs={"window": 3600, "stop_after": 1.0})
+    server.start()
+    time.sleep(0.2)  # let serve() bind before sending
+    sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    for datagram in (b"[]", b'{"values": [1]}', b'{"values": {"x": Infinity}}', b'{"values": {"x": NaN}}',
+                     b'{"tags": ["job:a"], "values": {"x": 2}}'):
+        sender.sendto(datagram, ("127.0.0.1", port))
+    sender.close()
+    server.join(5)
+
+    assert not server.is_alive()
+    (tags, metrics), = submitters[0].batches
+    assert tags == ["job:a"]
+    values = {m["metric"]: m["value"] for m in metrics}
+    assert values["x.count"] == 1
+    assert values["x.sum"] == 2.0
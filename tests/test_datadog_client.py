@@ -0,0 +1,174 @@
+import gzip
+import json
+import random
+import socket
+import string
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from dd_mlops_costs import datadog_client, spool
+from dd_mlops_costs.datadog_client import CollectorClient, MetricSubmitter, build_series, post_series_status
+
+
+def test_build_series_appends_per_metric_tags():
+    series = build_series(
+        [{"metric": "job.cost", "value": 1.0}, {"metric": "job.span.cost", "value": 0.5, "tags": ["span:a"]}],
+        ["customer:acme"],
+        timestamp=100,
+    )
+    assert series[0] == {"metric": "job.cost", "points": [[100, 1.0]], "tags": ["customer:acme"], "type": "gauge"}
+    assert series[1]["tags"] == ["customer:acme", "span:a"]
+
+
+def test_collector_client_sends_one_event_per_tag_set():
+    receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    receiver.bind(("127.0.0.1", 0))
+    receiver.settimeout(2)
+    client = CollectorClient(*receiver.getsockname())
+    client.submit([
+        {"metric": "job.cost", "value": 1.0},
+        {"metric": "job.duration", "value": 10.0},
+        {"metric": "job.span.cost", "value": 0.5, "tags": ["span:a"]},
+        {"metric": "job.span.cost", "value": 0.25, "tags": ["span:a/b"]},
+    ], ["customer:acme"])
+    events = [json.loads(receiver.recv(65535)) for _ in range(3)]
+    receiver.close()
+    by_tags = {tuple(event["tags"]): event["values"] for event in events}
+    assert by_tags == {
+        ("customer:acme",): {"job.cost": 1.0, "job.duration": 10.0},
+        ("customer:acme", "span:a"): {"job.span.cost": 0.5},
+        ("customer:acme", "span:a/b"): {"job.span.cost": 0.25},
+    }
+
+
+def test_close_submitters_shares_one_deadline(monkeypatch):
+    def slow_post(series, dd_api_key, timeout=None):
+        time.sleep(2)
+        return True
+
+    spooled = []
+    monkeypatch.setattr(datadog_client, "post_series", slow_post)
+    monkeypatch.setattr(datadog_client, "write_spool", lambda records: spooled.extend(records))
+    monkeypatch.setattr(datadog_client, "_SUBMITTERS", {})
+    for key in ("a", "b", "c"):
+        datadog_client.get_submitter(key).submit([{"metric": "m", "value": 1.0}], [], run_id=key)
+
+    start = time.monotonic()
+    datadog_client.close_submitters(timeout=0.5)
+    assert time.monotonic() - start < 1.0
+    assert sorted(run_id for run_id, _ in spooled) == ["a", "b", "c"]
+
+
+class SeriesEndpoint:
+    """Local stand-in for /api/v1/series that records every request."""
+
+    def __init__(self):
+        self.status = 202
+        self.latency = 0.0
+        self.requests = []
+        endpoint = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers["Content-Length"]))
+                time.sleep(endpoint.latency)
+                endpoint.requests.append({"headers": dict(self.headers), "size": len(body),
+                                          "series": json.loads(gzip.decompress(body))["series"]})
+                self.send_response(endpoint.status)
+                self.send_header("Content-Length", "2")
+                self.end_headers()
+                self.wfile.write(b"{}")
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/api/v1/series"
+        threading.Thread(target=self.server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+
+    def received(self):
+        return [entry for request in self.requests for entry in request["series"]]
+
+
+@pytest.fixture
+def endpoint(monkeypatch, tmp_path):
+    stand_in = SeriesEndpoint()
+    monkeypatch.setattr(datadog_client, "DATADOG_SERIES_URL", stand_in.url)
+    monkeypatch.setenv(spool.SPOOL_ENV_VAR, str(tmp_path / "spool.jsonl"))
+    yield stand_in
+    stand_in.server.shutdown()
+    stand_in.server.server_close()
+
+
+def test_post_sends_gzip_with_api_key(endpoint):
+    series = build_series([{"metric": "job.cost", "value": 1.5}], ["customer:acme"], timestamp=100)
+    assert post_series_status(series, "secret") == datadog_client.DELIVERED
+    (request,) = endpoint.requests
+    assert request["headers"]["Content-Encoding"] == "gzip"
+    assert request["headers"]["Content-Type"] == "application/json"
+    assert request["headers"]["DD-API-KEY"] == "secret"
+    assert request["series"] == series
+
+
+def test_payloads_are_split_at_max_payload_bytes(endpoint, monkeypatch):
+    monkeypatch.setattr(datadog_client, "MAX_PAYLOAD_BYTES", 4000)
+    rng = random.Random(0)
+    series = build_series(
+        [{"metric": "job.cost", "value": float(i), "tags": ["".join(rng.choices(string.ascii_letters, k=60))]}
+         for i in range(200)],
+        ["customer:acme"], timestamp=100)
+    assert datadog_client.post_series(series, "secret")
+    assert len(endpoint.requests) > 1
+    assert all(request["size"] <= 4000 for request in endpoint.requests)
+    assert endpoint.received() == series
+
+
+@pytest.mark.parametrize("status, expected", [
+    (202, datadog_client.DELIVERED),
+    (400, datadog_client.REJECTED),
+    (413, datadog_client.REJECTED),
+    (403, datadog_client.RETRY),
+    (408, datadog_client.RETRY),
+    (429, datadog_client.RETRY),
+    (500, datadog_client.RETRY),
+])
+def test_post_status_classifies_responses(endpoint, status, expected):
+    endpoint.status = status
+    series = build_series([{"metric": "job.cost", "value": 1.0}], [], timestamp=100)
+    assert post_series_status(series, "secret") == expected
+
+
+def test_submit_does_not_wait_for_a_slow_post(endpoint):
+    endpoint.latency = 1.0
+    submitter = MetricSubmitter("secret", flush_interval=0.0)
+    start = time.monotonic()
+    submitter.submit([{"metric": "job.cost", "value": 1.0}], [])
+    assert time.monotonic() - start < 0.1
+    assert submitter.close(timeout=5)
+    assert len(endpoint.received()) == 1
+
+
+def test_submits_within_flush_interval_share_one_request(endpoint):
+    submitter = MetricSubmitter("secret", flush_interval=0.3)
+    for i in range(3):
+        submitter.submit([{"metric": "job.cost", "value": float(i)}], [], run_id=f"jr_{i}")
+    assert submitter.flush(timeout=5)
+    (request,) = endpoint.requests
+    assert [entry["points"][0][1] for entry in request["series"]] == [0.0, 1.0, 2.0]
+    submitter.close()
+
+
+def test_failed_batches_are_spooled(endpoint, tmp_path):
+    endpoint.status = 500
+    submitter = MetricSubmitter("secret", flush_interval=0.0)
+    submitter.submit([{"metric": "job.cost", "value": 1.0}], ["customer:acme"], timestamp=100, run_id="jr_1")
+    assert submitter.close(timeout=5)
+    assert len(endpoint.requests) == 1
+    assert list(spool.iter_spool_file(str(tmp_path / "spool.jsonl"))) == [
+        ("jr_1", build_series([{"metric": "job.cost", "value": 1.0}], ["customer:acme"], timestamp=100))
+    ]
@@ -0,0 +1,130 @@
+import datetime as dt
+
+import boto3
+import pytest
+from botocore.stub import Stubber
+
+from dd_mlops_costs import cost_tracker, emr_costs, report_job_cost
+from dd_mlops_costs.emr_costs import InstanceUsage, calculate_emr_cost, gather_emr_job_data
+
+pytestmark = pytest.mark.usefixtures("glue_env")
+
+T0 = dt.datetime(2024, 1, 1, tzinfo=dt.timezone.utc)
+WINDOW = (T0.timestamp(), T0.timestamp() + 3600)
+
+
+def at(seconds):
+    return T0 + dt.timedelta(seconds=seconds)
+
+
+def make_instance(instance_id, instance_type, created, ended=None):
+    timeline = {"CreationDateTime": at(created)}
+    if ended is not None:
+        timeline["EndDateTime"] = at(ended)
+    return {"Id": instance_id, "InstanceType": instance_type, "Status": {"Timeline": timeline}}
+
+
+@pytest.fixture
+def emr(monkeypatch, tmp_path):
+    job_flow = tmp_path / "job-flow.json"
+    job_flow.write_text('{"jobFlowId": "j-1"}')
+    monkeypatch.setattr(emr_costs, "JOB_FLOW_PATH", str(job_flow))
+    client = boto3.client("emr", region_name="us-east-1", aws_access_key_id="test", aws_secret_access_key="test")
+    with Stubber(client) as stubber:
+        client.stubber = stubber
+        yield client
+        stubber.assert_no_pending_responses()
+
+
+def describe_cluster(emr, collection_type="INSTANCE_GROUP"):
+    emr.stubber.add_response("describe_cluster", {"Cluster": {
+        "Id": "j-1", "Name": "cluster", "ReleaseLabel": "emr-7.0.0", "InstanceCollectionType": collection_type,
+        "Status": {"State": "RUNNING", "Timeline": {"CreationDateTime": at(-600)}},
+    }}, {"ClusterId": "j-1"})
+
+
+def gather(emr):
+    # One worker keeps the stubbed list_instances calls in a predictable order.
+    return gather_emr_job_data(*WINDOW, emr=emr, max_workers=1)
+
+
+def test_scaling_cluster_is_clipped_to_the_window(emr):
+    describe_cluster(emr)
+    emr.stubber.add_response("list_instance_groups", {"InstanceGroups": [
+        {"Id": "ig-master", "InstanceType": "m5.xlarge"}, {"Id": "ig-core", "InstanceType": "m5.2xlarge"},
+    ]}, {"ClusterId": "j-1"})
+    # The master started before the window and is still running after it.
+    emr.stubber.add_response("list_instances", {"Instances": [make_instance("i-m", "m5.xlarge", -600)]},
+                             {"ClusterId": "j-1", "InstanceGroupId": "ig-master"})
+    # Core nodes scale up and down across two pages; one ends after the window, one
+    # ended before it and one started after it.
+    emr.stubber.add_response("list_instances", {"Instances": [
+        make_instance("i-1", "m5.2xlarge", 600, 1800),
+        make_instance("i-2", "m5.2xlarge", 1200, 4000),
+    ], "Marker": "page-2"}, {"ClusterId": "j-1", "InstanceGroupId": "ig-core"})
+    emr.stubber.add_response("list_instances", {"Instances": [
+        make_instance("i-0", "m5.2xlarge", -1200, -100),
+        make_instance("i-3", "m5.2xlarge", 4000),
+    ]}, {"ClusterId": "j-1", "InstanceGroupId": "ig-core", "Marker": "page-2"})
+
+    data = gather(emr)
+    assert data["instance_seconds"] == {"m5.xlarge": 3600, "m5.2xlarge": 1200 + 2400}
+    assert data["instance_types"] == ["m5.2xlarge", "m5.xlarge"]
+    assert data["peak_instances"] == 3
+    assert data["avg_instances"] == pytest.approx(2.0)
+    assert data["release_label"] == "emr-7.0.0"
+    # Static us-east-1 prices: m5.xlarge 0.192 + 0.048, m5.2xlarge 0.384 + 0.096.
+    assert calculate_emr_cost(data, 3600) == pytest.approx(0.24 * 1 + 0.48 * 1)
+
+
+def test_instance_fleets_are_listed_by_fleet(emr):
+    describe_cluster(emr, "INSTANCE_FLEET")
+    emr.stubber.add_response("list_instance_fleets", {"InstanceFleets": [{
+        "Id": "if-core",
+        "InstanceTypeSpecifications": [{"InstanceType": "m5.xlarge"}, {"InstanceType": "m5.2xlarge"}],
+    }]}, {"ClusterId": "j-1"})
+    emr.stubber.add_response("list_instances", {"Instances": [make_instance("i-1", "m5.xlarge", 0, 1800)]},
+                             {"ClusterId": "j-1", "InstanceFleetId": "if-core"})
+
+    data = gather(emr)
+    assert data["instance_seconds"] == {"m5.xlarge": 1800}
+    # Types configured on the fleet are priced up front even if none were launched.
+    assert set(data["prices"]) == {"m5.xlarge", "m5.2xlarge"}
+    assert (data["peak_instances"], data["avg_instances"]) == (1, pytest.approx(0.5))
+
+
+def test_peak_and_average_follow_the_timeline():
+    usage = InstanceUsage(0, 600, bucket_seconds=60)
+    usage.add("a", -100, 300)
+    usage.add("a", 120, 240)
+    usage.add("b", 200, 900)
+    usage.add("b", 700, 800)
+    assert list(usage.timeline()) == [1, 1, 2, 3, 2, 1, 1, 1, 1, 1]
+    assert usage.peak_instances() == 3
+    assert usage.avg_instances() == pytest.approx((300 + 120 + 400) / 600)
+    assert usage.instances == 3
+
+
+def test_listing_failure_is_reported_as_unavailable(emr):
+    emr.stubber.add_client_error("describe_cluster", "AccessDeniedException")
+    data = gather(emr)
+    assert data["instance_seconds"] is None
+    with pytest.raises(ValueError, match="unavailable"):
+        calculate_emr_cost(data, 3600)
+
+
+def test_unknown_instance_type_is_not_priced_as_zero():
+    data = {"region": "us-east-1", "cluster_id": "j-1", "instance_seconds": {"m5.xlarge": 3600, "x9.huge": 3600}}
+    with pytest.raises(ValueError, match="x9.huge"):
+        calculate_emr_cost(data, 3600)
+
+
+def test_report_job_cost_skips_unpriced_emr_cost(monkeypatch, submitter):
+    data = {"region": "us-east-1", "cluster_id": "j-1", "instance_types": ["x9.huge"],
+            "instance_seconds": {"x9.huge": 3600}}
+    monkeypatch.setattr(cost_tracker, "gather_emr_job_data", lambda window_start, window_end: data)
+
+    assert report_job_cost("acme", "emr", duration_seconds=3600) is None
+    (submit,) = submitter.submits
+    assert [metric["metric"] for metric in submit["metrics"]] == ["emr.job.duration"]
+    assert "cost_status:unpriced" in submit["tags"]
@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from dd_mlops_costs.glue_costs import calculate_glue_cost, calculate_glue_costs
+
+pytestmark = pytest.mark.usefixtures("glue_env")
+
+
+def test_batch_matches_scalar_cost():
+    df = pd.DataFrame({
+        "worker_type": ["G.1X", "G.2X", "G.025X", "G.8X"],
+        "region": ["us-east-1", "sa-east-1", "us-west-1", None],
+        "number_of_workers": [10, 2, None, 4],
+        "duration_seconds": [3600.0, 1800.0, 60.0, 10.0],
+    })
+    expected = [
+        calculate_glue_cost({"worker_type": w, "region": r or "unknown", "number_of_workers": 1 if pd.isna(n) else n}, d)
+        for w, r, n, d in df.itertuples(index=False)
+    ]
+    assert calculate_glue_costs(df).tolist() == pytest.approx(expected)
+
+
+def test_dpu_seconds_override_worker_configuration():
+    df = pd.DataFrame({
+        "worker_type": ["G.1X", "Z.2X"],
+        "region": ["us-east-1", "us-east-1"],
+        "number_of_workers": [10, 10],
+        "duration_seconds": [3600.0, 3600.0],
+        "dpu_seconds": [7200.0, 3600.0],
+    })
+    assert calculate_glue_costs(df).tolist() == pytest.approx([2 * 0.44, 0.44])
+
+
+def test_unknown_worker_type_raises():
+    df = pd.DataFrame({"worker_type": ["G.1X", "Z.2X"], "region": ["us-east-1"] * 2, "duration_seconds": [1.0, 1.0]})
+    with pytest.raises(ValueError, match="Z.2X"):
+        calculate_glue_costs(df)
+
+
+def test_rows_without_duration_or_dpu_seconds_raise():
+    df = pd.DataFrame({
+        "worker_type": ["G.1X", "G.1X", "G.1X"],
+        "region": ["us-east-1"] * 3,
+        "duration_seconds": [60.0, np.nan, np.nan],
+        "dpu_seconds": [np.nan, 30.0, np.nan],
+    }, index=[10, 11, 12])
+    with pytest.raises(ValueError, match=r"1 row\(s\).*\[12\]"):
+        calculate_glue_costs(df)
+    with pytest.raises(ValueError, match="neither duration_seconds"):
+        calculate_glue_costs(df[["worker_type", "region"]])
+
+
+def test_flex_rows_use_the_flex_rate():
+    df = pd.DataFrame({
+        "worker_type": ["G.1X", "G.1X", "G.1X", "G.1X"],
+        "region": ["us-east-1", "us-east-1", "sa-east-1", "us-east-1"],
+        "number_of_workers": [10, 10, 10, 10],
+        "duration_seconds": [3600.0] * 4,
+        "dpu_seconds": [np.nan, np.nan, np.nan, 7200.0],
+        "execution_class": ["STANDARD", "FLEX", "flex", "FLEX"],
+    })
+    assert calculate_glue_costs(df).tolist() == pytest.approx([10 * 0.44, 10 * 0.29, 10 * 0.46, 2 * 0.29])
+    assert calculate_glue_cost({"worker_type": "G.1X", "region": "us-east-1", "number_of_workers": 10,
+                                "execution_class": "FLEX"}, 3600) == pytest.approx(10 * 0.29)
+
+
+def test_flex_without_a_flex_price_falls_back_to_the_standard_rate():
+    df = pd.DataFrame({"worker_type": ["G.1X"], "region": ["eu-west-1"], "duration_seconds": [3600.0],
+                       "execution_class": ["FLEX"]})
+    assert calculate_glue_costs(df).tolist() == pytest.approx([0.44])
@@ -0,0 +1,104 @@
+import json
+import sys
+import time
+
+import pytest
+
+from dd_mlops_costs import job_context
+from dd_mlops_costs.job_context import parse_job_arguments, resolve_job_context
+
+
+def test_parse_job_arguments():
+    argv = ["--JOB_NAME", "etl", "--JOB_RUN_ID=jr_1", "--enable-metrics", "--TempDir", "s3://tmp", "positional"]
+    assert parse_job_arguments(argv) == {"JOB_NAME": "etl", "JOB_RUN_ID": "jr_1", "enable-metrics": "",
+                                         "TempDir": "s3://tmp"}
+
+
+@pytest.fixture
+def get_job_calls(glue_env, monkeypatch):
+    """Leaves worker details to the cache / get_job and records get_job calls."""
+    monkeypatch.delenv("GLUE_WORKER_TYPE")
+    monkeypatch.delenv("GLUE_NUMBER_OF_WORKERS")
+
+    class Calls(list):
+        answer = {"worker_type": "G.2X", "number_of_workers": 5}
+
+    calls = Calls()
+
+    def fetch_job_details(job_name, region, glue=None):
+        calls.append((job_name, region))
+        return dict(calls.answer)
+
+    monkeypatch.setattr(job_context, "fetch_job_details", fetch_job_details)
+    return calls
+
+
+def resolve():
+    resolve_job_context.cache_clear()
+    return resolve_job_context()
+
+
+def test_job_arguments_skip_the_api(get_job_calls, monkeypatch):
+    monkeypatch.setattr(sys, "argv", ["job.py", "--JOB_NAME", "etl", "--JOB_RUN_ID", "jr_9",
+                                      "--WORKER_TYPE", "G.4X", "--NUMBER_OF_WORKERS", "3"])
+    data = resolve()
+    assert (data["job_name"], data["job_run_id"], data["worker_type"], data["number_of_workers"]) == \
+        ("etl", "jr_9", "G.4X", 3)
+    assert get_job_calls == []
+
+
+def test_get_job_answer_is_cached(get_job_calls):
+    assert resolve()["worker_type"] == "G.2X"
+    assert resolve()["number_of_workers"] == 5
+    assert get_job_calls == [("test-job", "us-east-1")]
+
+
+def set_cache_age(seconds):
+    path = job_context._cache_path()
+    with open(path) as f:
+        cache = json.load(f)
+    for entry in cache.values():
+        entry["cached_at"] = time.time() - seconds
+    with open(path, "w") as f:
+        json.dump(cache, f)
+
+
+def test_unversioned_cache_expires_within_an_hour(get_job_calls):
+    resolve()
+    get_job_calls.answer["number_of_workers"] = 20
+    set_cache_age(30 * 60)
+    assert resolve()["number_of_workers"] == 5
+    set_cache_age(2 * 3600)
+    assert resolve()["number_of_workers"] == 20
+    assert len(get_job_calls) == 2
+
+
+def test_versioned_cache_is_kept_longer_and_keyed_by_version(get_job_calls, monkeypatch):
+    monkeypatch.setenv("JOB_VERSION", "1")
+    resolve()
+    set_cache_age(2 * 24 * 3600)
+    get_job_calls.answer["worker_type"] = "G.8X"
+    assert resolve()["worker_type"] == "G.2X"
+    monkeypatch.setenv("JOB_VERSION", "2")
+    assert resolve()["worker_type"] == "G.8X"
+    assert len(get_job_calls) == 2
+
+
+def test_cache_ttl_override(get_job_calls, monkeypatch):
+    monkeypatch.setenv(job_context.CACHE_TTL_ENV_VAR, "0")
+    resolve()
+    set_cache_age(1)
+    resolve()
+    assert len(get_job_calls) == 2
+
+
+def test_api_failure_falls_back_to_defaults(glue_env, monkeypatch):
+    monkeypatch.delenv("GLUE_WORKER_TYPE")
+    monkeypatch.delenv("GLUE_NUMBER_OF_WORKERS")
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("no credentials")
+
+    monkeypatch.setattr(job_context, "fetch_job_details", fail)
+    data = resolve()
+    assert (data["worker_type"], data["number_of_workers"]) == ("G.1X", 1)
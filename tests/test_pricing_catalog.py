@@ -0,0 +1,163 @@
+import json
+import os
+import time
+
+import pytest
+
+from dd_mlops_costs import pricing_catalog
+from dd_mlops_costs.pricing import get_glue_price
+from dd_mlops_costs.pricing_catalog import (EC2, EMR, GLUE, GLUE_ETL_DPU_HOUR, CatalogError, PricingCatalog,
+                                            get_catalog, iter_offer_prices, refresh_catalog, write_catalog)
+
+PRICES = [
+    (GLUE, "us-east-1", GLUE_ETL_DPU_HOUR, 0.44),
+    (GLUE, "eu-west-1", GLUE_ETL_DPU_HOUR, 0.44),
+    (EC2, "us-east-1", "m5.xlarge", 0.192),
+    (EMR, "us-east-1", "m5.xlarge", 0.048),
+]
+
+
+def make_offer(products):
+    """Builds a bulk offer document from (attributes, unit, usd) triples."""
+    offer = {"products": {}, "terms": {"OnDemand": {}}}
+    for i, (attributes, unit, usd) in enumerate(products):
+        sku = f"SKU{i}"
+        offer["products"][sku] = {"sku": sku, "attributes": attributes}
+        offer["terms"]["OnDemand"][sku] = {f"{sku}.TERM": {"priceDimensions": {
+            f"{sku}.TERM.DIM": {"unit": unit, "pricePerUnit": {"USD": str(usd)}},
+        }}}
+    return offer
+
+
+def ec2(**overrides):
+    attributes = {"servicecode": "AmazonEC2", "regionCode": "us-east-1", "instanceType": "m5.xlarge",
+                  "operatingSystem": "Linux", "tenancy": "Shared", "preInstalledSw": "NA",
+                  "capacitystatus": "Used"}
+    attributes.update(overrides)
+    return attributes
+
+
+def test_write_and_lookup_roundtrip(tmp_path):
+    path = str(tmp_path / "pricing.ddpc")
+    assert write_catalog(PRICES, path, built_at=123.0) == len(PRICES)
+    catalog = PricingCatalog(path)
+    assert len(catalog) == len(PRICES)
+    assert catalog.built_at == 123.0
+    for service, region, key, price in PRICES:
+        assert catalog.lookup(service, region, key) == price
+    assert catalog.lookup(GLUE, "sa-east-1", GLUE_ETL_DPU_HOUR) is None
+    assert catalog.lookup(EC2, "us-east-1", "m5.2xlarge") is None
+    catalog.close()
+
+
+def test_colliding_hashes_are_probed(tmp_path, monkeypatch):
+    monkeypatch.setattr(pricing_catalog, "_hash_key", lambda key: 7)
+    path = str(tmp_path / "pricing.ddpc")
+    write_catalog(PRICES, path)
+    catalog = PricingCatalog(path)
+    for service, region, key, price in PRICES:
+        assert catalog.lookup(service, region, key) == price
+    assert catalog.lookup(EMR, "us-east-1", "m5.2xlarge") is None
+
+
+def test_empty_catalog(tmp_path):
+    path = str(tmp_path / "pricing.ddpc")
+    assert write_catalog([], path) == 0
+    catalog = PricingCatalog(path)
+    assert len(catalog) == 0
+    assert catalog.lookup(GLUE, "us-east-1", GLUE_ETL_DPU_HOUR) is None
+
+
+@pytest.mark.parametrize("corrupt", [
+    lambda data: b"",
+    lambda data: data[:10],
+    lambda data: data[:pricing_catalog._HEADER.size + 8],
+    lambda data: b"XXXX" + data[4:],
+])
+def test_unreadable_files_raise_catalog_error(tmp_path, corrupt):
+    path = tmp_path / "pricing.ddpc"
+    write_catalog(PRICES, str(path))
+    path.write_bytes(corrupt(path.read_bytes()))
+    with pytest.raises(CatalogError):
+        PricingCatalog(str(path))
+
+
+@pytest.fixture
+def offer_file(tmp_path):
+    path = tmp_path / "offer.json"
+    path.write_text(json.dumps(make_offer([
+        ({"servicecode": "AWSGlue", "regionCode": "us-east-1", "usagetype": "USE1-ETL-DPU-Hour"}, "DPU-Hour", 0.5),
+    ])))
+    return str(path)
+
+
+def test_refresh_skips_a_fresh_catalog(tmp_path, offer_file):
+    path = str(tmp_path / "pricing.ddpc")
+    write_catalog(PRICES, path)
+    assert refresh_catalog([offer_file], path, ttl=3600) is False
+    assert PricingCatalog(path).lookup(GLUE, "us-east-1", GLUE_ETL_DPU_HOUR) == 0.44
+
+
+@pytest.mark.parametrize("existing", ["stale", "corrupt", "missing"])
+def test_refresh_rebuilds_stale_unreadable_or_missing_catalogs(tmp_path, offer_file, existing):
+    path = str(tmp_path / "pricing.ddpc")
+    if existing == "stale":
+        write_catalog(PRICES, path, built_at=time.time() - 7200)
+    elif existing == "corrupt":
+        with open(path, "wb") as f:
+            f.write(b"not a catalog")
+    assert refresh_catalog([offer_file], path, ttl=3600) is True
+    catalog = PricingCatalog(path)
+    assert len(catalog) == 1
+    assert catalog.lookup(GLUE, "us-east-1", GLUE_ETL_DPU_HOUR) == 0.5
+    assert not [name for name in os.listdir(tmp_path) if ".tmp." in name]
+
+
+def test_refresh_force_ignores_ttl(tmp_path, offer_file):
+    path = str(tmp_path / "pricing.ddpc")
+    write_catalog(PRICES, path)
+    assert refresh_catalog([offer_file], path, ttl=3600, force=True) is True
+
+
+def test_offer_prices_keep_only_tracked_products():
+    offer = make_offer([
+        ({"servicecode": "AWSGlue", "regionCode": "us-east-1", "usagetype": "USE1-ETL-DPU-Hour"}, "DPU-Hour", 0.44),
+        ({"servicecode": "AWSGlue", "location": "EU (Ireland)", "usagetype": "EU-ETL-DPU-Hour"}, "DPU-Hour", 0.44),
+        ({"servicecode": "AWSGlue", "regionCode": "us-east-1", "usagetype": "ETL-Flex-DPU-Hour"}, "DPU-Hour", 0.29),
+        ({"servicecode": "AWSGlue", "regionCode": "us-east-1", "usagetype": "USE1-Catalog-Request"}, "Requests", 1),
+        (ec2(), "Hrs", 0.192),
+        (ec2(tenancy="Dedicated"), "Hrs", 0.5),
+        (ec2(operatingSystem="Windows"), "Hrs", 0.376),
+        (ec2(capacitystatus="UnusedCapacityReservation"), "Hrs", 0.192),
+        (ec2(preInstalledSw="SQL Std"), "Hrs", 0.9),
+        ({"servicecode": "ElasticMapReduce", "regionCode": "us-east-1", "instanceType": "m5.xlarge",
+          "softwareType": "EMR"}, "Hrs", 0.048),
+        ({"servicecode": "ElasticMapReduce", "regionCode": "us-east-1", "instanceType": "m5.xlarge",
+          "softwareType": "MapR M7"}, "Hrs", 0.3),
+        ({"servicecode": "AWSGlue", "location": "Nowhere", "usagetype": "ETL-DPU-Hour"}, "DPU-Hour", 1),
+    ])
+    assert sorted(iter_offer_prices(offer)) == sorted([
+        (GLUE, "us-east-1", GLUE_ETL_DPU_HOUR, 0.44),
+        (GLUE, "eu-west-1", GLUE_ETL_DPU_HOUR, 0.44),
+        (GLUE, "us-east-1", "ETL-Flex-DPU-Hour", 0.29),
+        (EC2, "us-east-1", "m5.xlarge", 0.192),
+        (EMR, "us-east-1", "m5.xlarge", 0.048),
+    ])
+
+
+def test_glue_price_prefers_the_catalog(glue_env):
+    assert get_glue_price("us-east-1", "G.1X") == 0.44
+    write_catalog([(GLUE, "us-east-1", GLUE_ETL_DPU_HOUR, 0.5)], os.environ[pricing_catalog.CATALOG_ENV_VAR])
+    get_catalog.cache_clear()
+    assert get_glue_price("us-east-1", "G.1X") == 0.5
+    # Regions missing from the catalog still fall back to the static table.
+    assert get_glue_price("sa-east-1", "G.1X") == 0.69
+
+
+def test_glue_flex_price_prefers_the_catalog(glue_env):
+    assert get_glue_price("us-east-1", "G.1X", "FLEX") == 0.29
+    write_catalog([(GLUE, "us-east-1", GLUE_ETL_DPU_HOUR, 0.5), (GLUE, "us-east-1", "ETL-Flex-DPU-Hour", 0.3)],
+                  os.environ[pricing_catalog.CATALOG_ENV_VAR])
+    get_catalog.cache_clear()
+    assert get_glue_price("us-east-1", "G.1X", "FLEX") == 0.3
+    assert get_glue_price("us-east-1", "G.1X", "STANDARD") == 0.5
@@ -0,0 +1,69 @@
+import threading
+
+import pytest
+
+from dd_mlops_costs.sampler import WorkerSampler
+
+
+def test_integrates_worker_seconds_between_samples():
+    sampler = WorkerSampler(source=lambda: None)
+    sampler._record(0.0, 2, 2)
+    sampler._record(10.0, 6, 3)
+    sampler._record(20.0, 6, 3)
+    usage = sampler.utilization()
+    assert usage["worker_seconds"] == pytest.approx(2 * 10 + 6 * 10)
+    assert usage["avg_workers"] == pytest.approx(4.0)
+    assert usage["peak_workers"] == 6
+    assert usage["idle_fraction"] == pytest.approx(1 - (2 * 10 + 3 * 10) / 80)
+
+
+def test_idle_fraction_unknown_without_busy_counts():
+    sampler = WorkerSampler(source=lambda: None)
+    sampler._record(0.0, 2, None)
+    sampler._record(10.0, 2, None)
+    assert sampler.utilization()["idle_fraction"] is None
+
+
+def test_fewer_than_two_samples_gives_no_utilization():
+    sampler = WorkerSampler(source=lambda: None)
+    sampler._record(0.0, 2, 2)
+    assert sampler.utilization() is None
+
+
+def test_out_of_order_samples_are_ignored():
+    sampler = WorkerSampler(source=lambda: None)
+    sampler._record(0.0, 2, 2)
+    sampler._record(10.0, 2, 2)
+    sampler._record(5.0, 100, 100)
+    sampler._record(20.0, 2, 2)
+    usage = sampler.utilization()
+    assert usage["sampled_seconds"] == pytest.approx(20.0)
+    assert usage["worker_seconds"] == pytest.approx(40.0)
+    assert usage["peak_workers"] == 2
+
+
+def test_stop_ignores_a_sample_still_in_flight():
+    in_source = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def source():
+        calls.append(None)
+        if len(calls) == 2:
+            # The sampling thread's read hangs (e.g. a slow py4j call) past stop().
+            in_source.set()
+            release.wait(5)
+            return 50
+        return 4
+
+    sampler = WorkerSampler(source, interval=0.05).start()
+    assert in_source.wait(5)
+    usage = sampler.stop()
+    release.set()
+    sampler._thread.join(5)
+
+    assert usage is not None
+    assert usage["worker_seconds"] >= 0
+    assert usage["avg_workers"] == pytest.approx(4.0)
+    assert sampler.utilization() == usage
+    assert sampler.peak_workers == 4
@@ -0,0 +1,111 @@
+import threading
+import time
+
+import pytest
+
+from dd_mlops_costs import cost_span, report_job_cost, start_timer
+from dd_mlops_costs.spans import get_span_costs, get_span_timings, reset_spans
+
+RESOURCE_DATA = {"region": "us-east-1", "worker_type": "G.1X", "number_of_workers": 10}
+
+
+@pytest.fixture(autouse=True)
+def clean_spans():
+    reset_spans()
+    yield
+    reset_spans()
+
+
+def test_nested_spans_are_recorded_by_path():
+    with cost_span("outer"):
+        with cost_span("inner"):
+            time.sleep(0.01)
+        with cost_span("inner"):
+            pass
+    timings = get_span_timings()
+    assert set(timings) == {"outer", "outer/inner"}
+    assert timings["outer/inner"]["count"] == 2
+    assert timings["outer"]["count"] == 1
+    assert timings["outer"]["duration_seconds"] >= timings["outer/inner"]["duration_seconds"] >= 0.01
+
+
+def test_decorator_form():
+    @cost_span("train")
+    def train(x):
+        with cost_span("step"):
+            return x * 2
+
+    assert train(2) == 4
+    assert train(3) == 6
+    timings = get_span_timings()
+    assert timings["train"]["count"] == 2
+    assert timings["train/step"]["count"] == 2
+
+
+def test_span_is_recorded_when_body_raises():
+    with pytest.raises(KeyError):
+        with cost_span("failing"):
+            raise KeyError("x")
+    assert get_span_timings()["failing"]["count"] == 1
+    with cost_span("after"):
+        pass
+    assert "after" in get_span_timings()
+
+
+def test_stacks_are_isolated_per_thread():
+    ready = threading.Barrier(2)
+
+    def worker(name):
+        with cost_span(name):
+            ready.wait()
+            with cost_span("child"):
+                pass
+
+    threads = [threading.Thread(target=worker, args=(name,)) for name in ("a", "b")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert set(get_span_timings()) == {"a", "a/child", "b", "b/child"}
+
+
+def test_get_span_costs_prices_and_drains():
+    with cost_span("load"):
+        time.sleep(0.01)
+    (span,) = get_span_costs(RESOURCE_DATA)
+    assert span["span"] == "load"
+    assert span["count"] == 1
+    # G.1X is 1 DPU per worker at $0.44 per DPU-hour in us-east-1.
+    assert span["cost"] == pytest.approx(10 * 0.44 * span["duration_seconds"] / 3600)
+    assert get_span_costs(RESOURCE_DATA) == []
+    assert get_span_timings() == {}
+
+
+def test_start_timer_discards_earlier_spans():
+    with cost_span("before"):
+        pass
+    start_timer()
+    assert get_span_timings() == {}
+
+
+def test_report_job_cost_sends_job_and_span_metrics_in_one_submit(glue_env, submitter):
+    start_timer()
+    with cost_span("a"):
+        with cost_span("b"):
+            pass
+    report_job_cost("acme", "glue", duration_seconds=3600)
+
+    (first,) = submitter.submits
+    assert first["run_id"] == "jr_test"
+    by_metric = {}
+    for metric in first["metrics"]:
+        by_metric.setdefault(metric["metric"], []).append(metric)
+    assert by_metric["glue.job.cost"][0]["value"] == pytest.approx(10 * 0.44)
+    assert "tags" not in by_metric["glue.job.cost"][0]
+    assert sorted(m["tags"][0] for m in by_metric["glue.job.span.cost"]) == ["span:a", "span:a/b"]
+
+    # A second job in the same process must not report the first job's spans.
+    start_timer()
+    report_job_cost("acme", "glue", duration_seconds=60)
+    second = submitter.submits[1]
+    assert not [m for m in second["metrics"] if m["metric"].startswith("glue.job.span.")]
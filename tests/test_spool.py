@@ -0,0 +1,227 @@
+import io
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+
+import boto3
+import pytest
+from botocore.response import StreamingBody
+from botocore.stub import ANY, Stubber
+
+from dd_mlops_costs import spool
+
+
+def make_series(metric="glue.job.cost", value=1.0, tags=("customer:acme",), timestamp=100):
+    return [{"metric": metric, "points": [[timestamp, value]], "tags": list(tags), "type": "gauge"}]
+
+
+@pytest.fixture
+def sent(monkeypatch):
+    """
+    Captures what replay posts to Datadog; set sent.ok = False to fail every post, or
+    sent.invalid to a set of values that Datadog rejects with a 4xx.
+    """
+    from dd_mlops_costs import datadog_client
+
+    class Sent(list):
+        ok = True
+        invalid = set()
+        attempts = 0
+
+    batches = Sent()
+
+    def post_series_status(series, dd_api_key):
+        batches.attempts += 1
+        if any(entry["points"][0][1] in batches.invalid for entry in series):
+            return datadog_client.REJECTED
+        if not batches.ok:
+            return datadog_client.RETRY
+        batches.append(series)
+        return datadog_client.DELIVERED
+
+    monkeypatch.setattr(datadog_client, "post_series_status", post_series_status)
+    return batches
+
+
+def read_records(path):
+    return list(spool.iter_spool_file(path))
+
+
+def test_write_and_read_roundtrip(tmp_path):
+    path = str(tmp_path / "spool.jsonl")
+    assert spool.write_spool([("jr_1", make_series()), (None, make_series(value=2.0))], path) == 2
+    assert read_records(path) == [("jr_1", make_series()), (None, make_series(value=2.0))]
+
+
+def test_rotation_caps_the_spool(tmp_path):
+    path = str(tmp_path / "spool.jsonl")
+    line_size = len(spool._encode_records([("jr_0", make_series())]))
+    for i in range(3):
+        spool.write_spool([(f"jr_{i}", make_series())], path, max_bytes=2 * line_size)
+    assert [run_id for run_id, _ in read_records(path)] == ["jr_2"]
+    assert [run_id for run_id, _ in read_records(f"{path}.1")] == ["jr_0", "jr_1"]
+    for i in (3, 4):
+        spool.write_spool([(f"jr_{i}", make_series())], path, max_bytes=2 * line_size)
+    # The next rotation replaces the previous one, so at most two caps are kept.
+    assert [run_id for run_id, _ in read_records(f"{path}.1")] == ["jr_2", "jr_3"]
+    assert [run_id for run_id, _ in read_records(path)] == ["jr_4"]
+
+
+def test_writers_in_other_processes_wait_for_the_spool_lock(tmp_path):
+    path = str(tmp_path / "spool.jsonl")
+    holder = subprocess.Popen([sys.executable, "-c", (
+        "import fcntl, sys, time\n"
+        f"lock = open({path + '.lock'!r}, 'a')\n"
+        "fcntl.flock(lock.fileno(), fcntl.LOCK_EX)\n"
+        "print('locked', flush=True)\n"
+        "time.sleep(0.5)\n"
+    )], stdout=subprocess.PIPE, text=True)
+    try:
+        assert holder.stdout.readline().strip() == "locked"
+        start = time.monotonic()
+        spool.write_spool([("jr_1", make_series())], path)
+        assert time.monotonic() - start >= 0.3
+    finally:
+        holder.wait()
+    assert [run_id for run_id, _ in read_records(path)] == ["jr_1"]
+
+
+def test_torn_and_malformed_lines_are_skipped(tmp_path, caplog):
+    path = str(tmp_path / "spool.jsonl")
+    spool.write_spool([("jr_1", make_series())], path)
+    with open(path, "ab") as f:
+        f.write(b'[1, 2]\n{"run_id": "jr_2"}\n{"run_id": "jr_3", "ser')
+    with caplog.at_level(logging.WARNING, logger=spool.__name__):
+        assert [run_id for run_id, _ in read_records(path)] == ["jr_1"]
+    assert caplog.text.count("Skipping malformed spool line") == 3
+
+
+def test_replay_deduplicates_by_run_and_series_identity(tmp_path, sent):
+    path = str(tmp_path / "spool.jsonl")
+    job = make_series()
+    span = make_series("glue.job.span.cost", 0.5, ("customer:acme", "span:a"))
+    spool.write_spool([("jr_1", job), ("jr_1", span), ("jr_1", job), (None, job), (None, job)], path)
+
+    assert spool.replay_spool("key", path) == 3
+    (batch,) = sent
+    assert [entry["metric"] for entry in batch] == ["glue.job.cost", "glue.job.span.cost", "glue.job.cost"]
+    assert os.listdir(tmp_path) == ["spool.jsonl.lock"]
+
+
+def test_replay_requeues_failed_batches(tmp_path, sent):
+    path = str(tmp_path / "spool.jsonl")
+    spool.write_spool([("jr_1", make_series()), ("jr_2", make_series(value=2.0))], path)
+    sent.ok = False
+    assert spool.replay_spool("key", path, max_attempts=1) == 0
+    assert [run_id for run_id, _ in read_records(path)] == ["jr_1", "jr_2"]
+    assert sorted(os.listdir(tmp_path)) == ["spool.jsonl", "spool.jsonl.lock"]
+
+    sent.ok = True
+    assert spool.replay_spool("key", path) == 2
+    assert not os.path.exists(path)
+
+
+def test_replay_drops_only_rejected_records(tmp_path, sent):
+    path = str(tmp_path / "spool.jsonl")
+    spool.write_spool([(f"jr_{i}", make_series(value=float(i))) for i in range(8)], path)
+    sent.invalid = {5.0}
+    assert spool.replay_spool("key", path) == 7
+    assert sorted(entry["points"][0][1] for batch in sent for entry in batch) == [0, 1, 2, 3, 4, 6, 7]
+    # Rejected batches are split rather than retried: 1 + 2 + 2 + 2 posts.
+    assert sent.attempts == 7
+    assert not os.path.exists(path)
+
+
+def test_replay_keeps_the_rest_of_a_rejected_batch_when_delivery_fails(tmp_path, sent):
+    path = str(tmp_path / "spool.jsonl")
+    spool.write_spool([("jr_1", make_series(value=1.0)), ("jr_2", make_series(value=2.0))], path)
+    sent.ok = False
+    sent.invalid = {2.0}
+    assert spool.replay_spool("key", path, max_attempts=1) == 0
+    assert [run_id for run_id, _ in read_records(path)] == ["jr_1"]
+
+
+def test_replay_picks_up_files_claimed_by_an_interrupted_replay(tmp_path, sent):
+    path = str(tmp_path / "spool.jsonl")
+    spool.write_spool([("jr_1", make_series())], f"{path}.replay.1.1.0")
+    spool.write_spool([("jr_2", make_series(value=2.0))], path)
+    assert spool.replay_spool("key", path) == 2
+    assert os.listdir(tmp_path) == ["spool.jsonl.lock"]
+
+
+def test_spool_path_warns_once_when_unset(monkeypatch, caplog):
+    monkeypatch.delenv(spool.SPOOL_ENV_VAR, raising=False)
+    monkeypatch.setattr(sys, "argv", ["job.py"])
+    monkeypatch.setattr(spool, "_WARNED_DEFAULT_PATH", False)
+    with caplog.at_level(logging.WARNING, logger=spool.__name__):
+        assert spool.spool_path() == spool.DEFAULT_SPOOL_PATH
+        spool.spool_path()
+    assert caplog.text.count("is not set") == 1
+
+
+def test_spool_path_from_job_argument(monkeypatch):
+    monkeypatch.delenv(spool.SPOOL_ENV_VAR, raising=False)
+    monkeypatch.setattr(sys, "argv", ["job.py", "--DD_MLOPS_SPOOL_PATH", "s3://bucket/spool"])
+    assert spool.spool_path() == "s3://bucket/spool"
+
+
+@pytest.fixture
+def s3():
+    client = boto3.client("s3", region_name="us-east-1", aws_access_key_id="test", aws_secret_access_key="test")
+    with Stubber(client) as stubber:
+        client.stubber = stubber
+        yield client
+        stubber.assert_no_pending_responses()
+
+
+def test_write_spool_to_s3_puts_one_object_per_write(s3):
+    s3.stubber.add_response("put_object", {}, {"Bucket": "bucket", "Key": ANY, "Body": ANY})
+    captured = {}
+    original = s3.put_object
+
+    def put_object(**kwargs):
+        captured.update(kwargs)
+        return original(**kwargs)
+
+    s3.put_object = put_object
+    assert spool.write_spool([("jr_1", make_series())], "s3://bucket/dd/spool/", s3=s3) == 1
+    assert captured["Key"].startswith("dd/spool/") and captured["Key"].endswith(".jsonl")
+    assert json.loads(captured["Body"]) == {"run_id": "jr_1", "series": make_series()}
+
+
+def test_write_spool_to_s3_logs_instead_of_raising(s3, caplog):
+    s3.stubber.add_client_error("put_object", "AccessDenied")
+    assert spool.write_spool([("jr_1", make_series())], "s3://bucket/spool", s3=s3) == 0
+    assert "Unable to spool" in caplog.text
+
+
+def s3_body(records):
+    data = spool._encode_records(records)
+    return StreamingBody(io.BytesIO(data), len(data))
+
+
+def test_replay_from_s3_deletes_replayed_objects(s3, sent):
+    s3.stubber.add_response("list_objects_v2", {"Contents": [{"Key": "spool/1-a.jsonl"}, {"Key": "spool/2-b.jsonl"}],
+                                                "IsTruncated": False},
+                            {"Bucket": "bucket", "Prefix": "spool/"})
+    s3.stubber.add_response("get_object", {"Body": s3_body([("jr_1", make_series())])},
+                            {"Bucket": "bucket", "Key": "spool/1-a.jsonl"})
+    s3.stubber.add_response("get_object", {"Body": s3_body([("jr_1", make_series()), ("jr_2", make_series(value=2.0))])},
+                            {"Bucket": "bucket", "Key": "spool/2-b.jsonl"})
+    s3.stubber.add_response("delete_object", {}, {"Bucket": "bucket", "Key": "spool/1-a.jsonl"})
+    s3.stubber.add_response("delete_object", {}, {"Bucket": "bucket", "Key": "spool/2-b.jsonl"})
+
+    assert spool.replay_spool("key", "s3://bucket/spool", s3=s3) == 2
+    assert [entry["points"][0][1] for entry in sent[0]] == [1.0, 2.0]
+
+
+def test_replay_from_s3_keeps_objects_when_requeue_fails(s3, sent):
+    sent.ok = False
+    s3.stubber.add_response("list_objects_v2", {"Contents": [{"Key": "spool/1-a.jsonl"}], "IsTruncated": False})
+    s3.stubber.add_response("get_object", {"Body": s3_body([("jr_1", make_series())])})
+    s3.stubber.add_client_error("put_object", "AccessDenied")
+    # No delete_object is expected: the original object must survive.
+    assert spool.replay_spool("key", "s3://bucket/spool", max_attempts=1, s3=s3) == 0